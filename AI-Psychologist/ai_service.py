@@ -5,19 +5,276 @@ Handles communication with Ollama AI service
 
 import streamlit as st
 import requests
+import json
+import logging
+import threading
+import os
+import re
 import time
+from collections import OrderedDict
+from config import (
+    OLLAMA_HOST, AVAILABLE_MODELS, PRELOAD_MODELS, MAX_RETRIES, AI_TEMPERATURE, AI_TOP_P,
+    CHAT_SESSIONS_DIR, CONTEXT_CACHE_MAX_SESSIONS, CONTEXT_CACHE_MAX_TOKENS,
+    MODEL_CONTEXT_TOKENS, DEFAULT_CONTEXT_TOKENS, RESPONSE_TOKEN_RESERVE, SUMMARY_MAX_TOKENS,
+    SPECULATIVE_PREFILL, LONG_TERM_MEMORY, MEMORY_MAX_TOKENS
+)
+from backend_pool import get_pool, model_tag
+from response_cache import get_response_cache, is_cacheable
+from metrics import get_metrics
+from prefill import get_prefetcher
+from rate_limiter import get_rate_limiter
+from memory_index import get_memory
 
-OLLAMA_API = "http://localhost:11434/api/generate"
-AVAILABLE_MODELS = ["mistral:latest", "phi3", "llama2", "codellama"]
+logger = logging.getLogger(__name__)
 
-def get_ai_response(model, conversation_history, max_retries=3):
-    """Get response from AI model with retry logic"""
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+class ContextCache:
+    """LRU cache of Ollama context token arrays per chat session
     
-    # Build conversation context
-    full_convo = "\n".join(
+    ``/api/generate`` returns a ``context`` array encoding the prompt and reply
+    it just evaluated. Sending it back with the next request lets Ollama
+    resume from that state, so only the new user turn has to be evaluated
+    instead of the whole transcript. Entries are keyed by
+    ``(username, chat)`` and remember the model and how many history
+    messages they cover, so a stale context is never reused.
+    """
+
+    def __init__(self, max_sessions, max_tokens):
+        self.max_sessions = max_sessions
+        self.max_tokens = max_tokens
+        self._entries = OrderedDict()
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def get(self, session_key, model, turns):
+        """Return the cached context if it covers exactly ``turns`` messages"""
+        if session_key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(session_key)
+            if entry is None:
+                return None
+            if entry["model"] != model or entry["turns"] != turns:
+                self._drop(session_key)
+                return None
+            self._entries.move_to_end(session_key)
+            return entry["context"]
+
+    def put(self, session_key, model, turns, context):
+        """Store the context returned for a session, evicting old entries"""
+        if session_key is None or not context:
+            return
+        with self._lock:
+            self._drop(session_key)
+            if len(context) > self.max_tokens:
+                return
+            self._entries[session_key] = {"model": model, "turns": turns, "context": context}
+            self._tokens += len(context)
+            while len(self._entries) > self.max_sessions or self._tokens > self.max_tokens:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, session_key):
+        """Forget the cached context of a session"""
+        with self._lock:
+            self._drop(session_key)
+
+    def _drop(self, session_key):
+        entry = self._entries.pop(session_key, None)
+        if entry is not None:
+            self._tokens -= len(entry["context"])
+
+context_cache = ContextCache(CONTEXT_CACHE_MAX_SESSIONS, CONTEXT_CACHE_MAX_TOKENS)
+
+def invalidate_context(username, chat):
+    """Drop the cached model context of a chat, e.g. after it was reloaded"""
+    context_cache.invalidate((username, chat))
+
+def estimate_tokens(text):
+    """Estimate the token count of a text without loading a tokenizer
+    
+    Counts words and punctuation marks and adds a margin for long words that
+    BPE tokenizers split into several pieces; close enough for budgeting.
+    """
+    pieces = TOKEN_PATTERN.findall(text)
+    return len(pieces) + sum(len(p) // 8 for p in pieces)
+
+def message_tokens(message):
+    """Estimate the tokens a history message takes up in the prompt"""
+    return estimate_tokens(message["text"]) + 4  # Speaker label and newline
+
+def model_context_tokens(model):
+    """Get the context window size used for a model"""
+    return MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+
+def history_token_budget(model):
+    """Tokens left for verbatim history after the fixed parts of the prompt"""
+    memory = MEMORY_MAX_TOKENS if LONG_TERM_MEMORY else 0
+    return (model_context_tokens(model) - RESPONSE_TOKEN_RESERVE
+            - SUMMARY_MAX_TOKENS - memory - estimate_tokens(build_prompt([])))
+
+def summary_path(username, chat):
+    """Get the path of the rolling summary stored next to a chat file"""
+    return os.path.join(CHAT_SESSIONS_DIR, username, os.path.splitext(chat)[0] + ".summary")
+
+def load_summary(session_key):
+    """Load the rolling summary of a chat, covering its first ``turns`` messages"""
+    try:
+        with open(summary_path(*session_key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"turns": 0, "text": ""}
+
+def save_summary(session_key, summary):
+    """Save the rolling summary of a chat"""
+    try:
+        path = summary_path(*session_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False)
+    except OSError:
+        pass
+
+def delete_summary(username, chat):
+    """Delete the rolling summary of a chat"""
+    try:
+        os.remove(summary_path(username, chat))
+    except OSError:
+        pass
+
+def summary_prompt(summary_text, turns):
+    """Build the prompt that folds conversation turns into the running summary"""
+    new_turns = "\n".join(
         f"{'User' if m['role'] == 'user' else 'AI'}: {m['text']}"
-        for m in conversation_history
+        for m in turns
     )
+    return f"""Update the summary of a supportive conversation between a user and an AI psychologist.
+Keep the user's main concerns, feelings, relevant personal details and any advice already given.
+Write at most {SUMMARY_MAX_TOKENS * 3 // 4} words.
+
+Current summary:
+{summary_text or "(none yet)"}
+
+New conversation turns:
+{new_turns}
+
+Updated summary:"""
+
+def summary_chunk_budget(model):
+    """Tokens of turns one summary call can take next to its instructions, the current summary and the reply"""
+    return model_context_tokens(model) - 2 * SUMMARY_MAX_TOKENS - estimate_tokens(summary_prompt("", []))
+
+def summarize_turns(model, summary_text, turns):
+    """Fold conversation turns into the running summary with one model call"""
+    prompt = summary_prompt(summary_text, turns)
+    try:
+        response = get_pool().post(model, "/api/generate", {
+            "model": model,
+            "prompt": prompt,
+            "stream": False,
+            "options": {
+                "temperature": 0.2,
+                "num_predict": SUMMARY_MAX_TOKENS,
+                "num_ctx": model_context_tokens(model)
+            }
+        }, retries=1)
+        if response.status_code == 200:
+            return response.json().get("response", "").strip() or None
+    except requests.exceptions.RequestException:
+        pass
+    return None
+
+def fit_history(model, conversation_history, session_key=None):
+    """Fit the history into the model's token budget
+    
+    Returns ``(summary_text, recent_messages)``. Recent turns are kept
+    verbatim; once they no longer fit, the oldest ones are folded into a
+    rolling summary stored next to the chat. The summary is only ever
+    extended with the turns that just fell out of the window, and enough
+    turns are folded at once that it is not touched again for a while, so
+    the prompt stays roughly the same size however long the chat runs.
+    Turns are folded a chunk per model call so each summary prompt fits
+    the model's context, e.g. for a long chat that has no summary yet.
+    """
+    budget = history_token_budget(model)
+    
+    # Walk back from the newest message to find what fits verbatim
+    keep_from, half_from, used = len(conversation_history), len(conversation_history), 0
+    for i in range(len(conversation_history) - 1, -1, -1):
+        used += message_tokens(conversation_history[i])
+        if used > budget:
+            break
+        keep_from = i
+        if used <= budget // 2:
+            half_from = i
+    if keep_from == 0:
+        return "", conversation_history
+    # Always keep the newest message verbatim, even when it alone is over budget
+    keep_from = min(keep_from, len(conversation_history) - 1)
+    half_from = min(half_from, len(conversation_history) - 1)
+    
+    summary = load_summary(session_key) if session_key else {"turns": 0, "text": ""}
+    if summary["turns"] > len(conversation_history):
+        summary = {"turns": 0, "text": ""}  # History was edited, start over
+    
+    if summary["turns"] < keep_from:
+        # Fold everything up to the half-budget point so the next turns fit as is
+        chunk_budget = summary_chunk_budget(model)
+        while summary["turns"] < half_from:
+            end, used = summary["turns"], 0
+            # At least one message per call, even one that is over the budget on its own
+            while end < half_from and (end == summary["turns"]
+                                       or used + message_tokens(conversation_history[end]) <= chunk_budget):
+                used += message_tokens(conversation_history[end])
+                end += 1
+            text = summarize_turns(model, summary["text"], conversation_history[summary["turns"]:end])
+            if text is None:
+                # Summarizing failed, drop the oldest turns rather than overflow
+                return summary["text"], conversation_history[max(keep_from, summary["turns"]):]
+            # Saved after every chunk, so a failure later on keeps what was folded
+            summary = {"turns": end, "text": text}
+            if session_key:
+                save_summary(session_key, summary)
+    
+    return summary["text"], conversation_history[summary["turns"]:]
+
+def recall_memories(conversation_history, session_key):
+    """Notes on past turns from the user's other chats that relate to the newest message"""
+    memory = get_memory()
+    if memory is None or session_key is None or not conversation_history:
+        return ""
+    if conversation_history[-1]["role"] != "user":
+        return ""
+    try:
+        with get_metrics().timer("memory_recall_seconds"):
+            texts = memory.recall(*session_key, conversation_history[-1]["text"])
+    except Exception as e:
+        get_metrics().increment("memory_errors_total")
+        logger.warning("Long-term memory not available for %s/%s: %s", *session_key, e)
+        return ""
+    notes, used = [], 0
+    for text in texts:
+        note = " ".join(text.split())
+        used += estimate_tokens(note) + 2
+        if used > MEMORY_MAX_TOKENS:
+            break
+        notes.append(f"- {note}")
+    if not notes:
+        return ""
+    return "(From the user's earlier conversations, use only if relevant:\n" + "\n".join(notes) + ")\n"
+
+def build_prompt(conversation_history, summary="", memory=""):
+    """Build the full model prompt from the conversation history
+    
+    ``memory`` is placed right before the newest message, so the start of
+    the prompt stays the same from turn to turn.
+    """
+    # Build conversation context
+    lines = [f"{'User' if m['role'] == 'user' else 'AI'}: {m['text']}" for m in conversation_history]
+    if memory and lines:
+        lines.insert(len(lines) - 1, memory.rstrip("\n"))
+    full_convo = "\n".join(lines)
+    earlier = f"Summary of the earlier conversation:\n{summary}\n\n" if summary else ""
     
     prompt = f"""You are a caring, empathetic AI psychologist. Your role is to:
 - Listen actively and respond with empathy
@@ -28,55 +285,301 @@ def get_ai_response(model, conversation_history, max_retries=3):
 
 Important: You are not a replacement for professional mental health services.
 
-Conversation so far:
+{earlier}Conversation so far:
 {full_convo}
 
 AI:"""
+    return prompt
+
+def request_options(model):
+    """Sampling and context options sent with every chat request"""
+    return {
+        "temperature": AI_TEMPERATURE,
+        "top_p": AI_TOP_P,
+        "num_ctx": model_context_tokens(model)
+    }
+
+def uses_memory(session_key):
+    """True when replies in this chat may draw on the user's other chats, which makes them private"""
+    return session_key is not None and get_memory() is not None
+
+def get_cached_response(model, conversation_history, session_key=None):
+    """Return a cached reply to this conversation, or None"""
+    cache = get_response_cache()
+    if cache is None or uses_memory(session_key) or not is_cacheable(conversation_history, AI_TEMPERATURE):
+        return None
+    cached = cache.get(cache.key(model, request_options(model), conversation_history))
+    if cached is not None:
+        get_metrics().increment("requests_total", model=model, outcome="cached")
+    return cached
+
+def cache_response(model, conversation_history, text, seconds):
+    """Remember a complete reply if the cache rules allow it"""
+    cache = get_response_cache()
+    if cache is None or not is_cacheable(conversation_history, AI_TEMPERATURE):
+        return
+    cache.put(cache.key(model, request_options(model), conversation_history), text, seconds)
+
+def build_request(model, conversation_history, session_key=None, stream=False):
+    """Build the generate request, reusing the cached context when possible
+    
+    Returns the request and whether notes from the user's other chats were
+    added to it; such a reply must never go into the shared response cache.
+    """
+    request = {
+        "model": model,
+        "stream": stream,
+        "options": request_options(model)
+    }
     
-    for attempt in range(max_retries):
+    memory = recall_memories(conversation_history, session_key)
+    context = context_cache.get(session_key, model, len(conversation_history) - 1)
+    if context is not None and conversation_history[-1]["role"] == "user":
+        new_turn = f"{memory}User: {conversation_history[-1]['text']}\n\nAI:"
+        # Only resume while the cached context leaves room for the reply
+        if len(context) + estimate_tokens(new_turn) <= model_context_tokens(model) - RESPONSE_TOKEN_RESERVE:
+            # The model already holds everything but the new user turn
+            request["prompt"] = new_turn
+            request["context"] = context
+            return request, bool(memory)
+    
+    summary, recent = fit_history(model, conversation_history, session_key)
+    request["prompt"] = build_prompt(recent, summary, memory)
+    return request, bool(memory)
+
+def prefill_request(model, conversation_history, session_key=None):
+    """Request that evaluates what the next turn's prompt will start with
+    
+    After a reply that is the cached context; otherwise the prompt up to
+    the next user turn. The prompt is never empty, since Ollama only loads
+    the model for an empty prompt. Returns None when the chat no longer
+    fits and would first need summarizing, which a prefill never triggers.
+    """
+    # Ollama only enforces positive limits, so 1 rather than 0 keeps generation to a single token
+    request = {"model": model, "stream": False, "options": dict(request_options(model), num_predict=1)}
+    context = context_cache.get(session_key, model, len(conversation_history))
+    if context is not None:
+        request["context"] = context
+        request["prompt"] = "User:"
+        return request
+    if sum(message_tokens(m) for m in conversation_history) > history_token_budget(model):
+        return None
+    prompt = build_prompt(conversation_history + [{"role": "user", "text": ""}])
+    request["prompt"] = prompt[:prompt.rindex("User:") + len("User:")]
+    return request
+
+def speculative_prefill(model, conversation_history, session_key):
+    """Warm the model's prompt cache for a chat's next turn when SPECULATIVE_PREFILL is on"""
+    if not SPECULATIVE_PREFILL or session_key is None:
+        return False
+    if conversation_history and conversation_history[-1]["role"] != "ai":
+        return False
+    request = prefill_request(model, conversation_history, session_key)
+    if request is None:
+        return False
+    return get_prefetcher().request(session_key[0], model, request)
+
+def charge_tokens(session_key, tokens):
+    """Charge generated tokens to the user's rate limit quota"""
+    if session_key is not None:
+        get_rate_limiter().charge_tokens(session_key[0], tokens)
+
+def record_generation(model, data, seconds, session_key=None):
+    """Record timing and token counts from Ollama's final response chunk"""
+    charge_tokens(session_key, data.get("eval_count", 0))
+    metrics = get_metrics()
+    metrics.increment("requests_total", model=model, outcome="ok")
+    metrics.observe("generation_seconds", seconds, model=model)
+    if data.get("prompt_eval_count") is not None:
+        metrics.observe("prompt_tokens", data["prompt_eval_count"], model=model)
+    if data.get("eval_count") and data.get("eval_duration"):
+        metrics.observe("tokens_per_second", data["eval_count"] / (data["eval_duration"] / 1e9), model=model)
+
+def connection_error_message(error):
+    """Turn a request exception into the error text shown in the chat"""
+    if isinstance(error, requests.exceptions.Timeout):
+        return "Error: Request timed out. Please try again."
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return f"Error: Cannot connect to Ollama. Please ensure Ollama is running on {OLLAMA_HOST}"
+    return f"Error: {str(error)}"
+
+def get_ai_response(model, conversation_history, max_retries=MAX_RETRIES, session_key=None,
+                    use_cache=True):
+    """Get response from AI model with retry logic
+    
+    ``session_key`` is the ``(username, chat)`` pair of the conversation; when
+    given, the model context is cached so the next turn only sends the new
+    message. ``use_cache=False`` skips the response cache lookup, for callers
+    that already made it; the reply is still stored.
+    """
+    if use_cache:
+        cached = get_cached_response(model, conversation_history, session_key)
+        if cached is not None:
+            return cached
+    
+    request, remembered = build_request(model, conversation_history, session_key)
+    context_cache.invalidate(session_key)
+    
+    started = time.perf_counter()
+    try:
+        response = get_pool().post(model, "/api/generate", request, retries=max_retries)
+        if response.status_code == 200:
+            data = response.json()
+            record_generation(model, data, time.perf_counter() - started, session_key)
+            context_cache.put(session_key, model, len(conversation_history) + 1, data.get("context"))
+            if "response" in data and not remembered:
+                cache_response(model, conversation_history, data["response"],
+                               data.get("total_duration", 0) / 1e9)
+            return data.get("response", "I apologize, but I couldn't generate a response.")
+        get_metrics().increment("requests_total", model=model, outcome="error")
+        return f"Error: Unable to connect to AI service (Status: {response.status_code})"
+    except Exception as e:
+        get_metrics().increment("requests_total", model=model, outcome="error")
+        return connection_error_message(e)
+
+class ResponseStream:
+    """Iterable over a streamed AI response that keeps the text received so far
+    
+    Ollama sends the completion as newline-delimited JSON chunks. Iterating
+    yields the text of each chunk as it arrives; ``text`` always holds what has
+    been generated so far, so a reply that is cut short by a timeout or by the
+    user cancelling the run can still be kept.
+    """
+
+    def __init__(self, model, conversation_history, max_retries=MAX_RETRIES, session_key=None,
+                 use_cache=True):
+        self.model = model
+        self.conversation_history = list(conversation_history)
+        self.max_retries = max_retries
+        self.session_key = session_key
+        self.use_cache = use_cache
+        self.text = ""
+        self.done = False
+        self.error = None
+
+    @property
+    def partial(self):
+        """True when some text arrived but the model never finished"""
+        return bool(self.text) and not self.done
+
+    def __iter__(self):
+        cached = (get_cached_response(self.model, self.conversation_history, self.session_key)
+                  if self.use_cache else None)
+        if cached is not None:
+            self.text = cached
+            self.done = True
+            yield cached
+            return
+        
+        request, remembered = build_request(self.model, self.conversation_history, self.session_key,
+                                            stream=True)
+        context_cache.invalidate(self.session_key)
+        
+        started = time.perf_counter()
         try:
-            response = requests.post(OLLAMA_API, json={
-                "model": model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.7,
-                    "top_p": 0.9
-                }
-            }, timeout=30)
-            
-            if response.status_code == 200:
-                return response.json().get("response", "I apologize, but I couldn't generate a response.")
-            else:
-                if attempt == max_retries - 1:
-                    return f"Error: Unable to connect to AI service (Status: {response.status_code})"
-                time.sleep(1)  # Brief delay before retry
-                
-        except requests.exceptions.ConnectionError:
-            if attempt == max_retries - 1:
-                return "Error: Cannot connect to Ollama. Please ensure Ollama is running on localhost:11434"
-            time.sleep(1)
-        except requests.exceptions.Timeout:
-            if attempt == max_retries - 1:
-                return "Error: Request timed out. Please try again."
-            time.sleep(1)
+            # Connecting is retried by the pool; once text is shown the reply is kept as is
+            with get_pool().post(self.model, "/api/generate", request, stream=True,
+                                 retries=self.max_retries) as response:
+                if response.status_code != 200:
+                    self.error = f"Error: Unable to connect to AI service (Status: {response.status_code})"
+                else:
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            self.error = f"Error: {chunk['error']}"
+                            break
+                        piece = chunk.get("response", "")
+                        if piece:
+                            if not self.text:
+                                get_metrics().observe("time_to_first_token_seconds",
+                                                      time.perf_counter() - started, model=self.model)
+                            self.text += piece
+                            yield piece
+                        if chunk.get("done"):
+                            self.done = True
+                            record_generation(self.model, chunk, time.perf_counter() - started,
+                                              self.session_key)
+                            context_cache.put(self.session_key, self.model,
+                                              len(self.conversation_history) + 1, chunk.get("context"))
+                            if not remembered:
+                                cache_response(self.model, self.conversation_history, self.text,
+                                               chunk.get("total_duration", 0) / 1e9)
+                            return
+                    else:
+                        self.error = "Error: Response ended unexpectedly."
         except Exception as e:
-            if attempt == max_retries - 1:
-                return f"Error: {str(e)}"
-            time.sleep(1)
+            self.error = connection_error_message(e)
+        finally:
+            # Also runs when a stop or rerun closes the stream mid-reply
+            if not self.done:
+                get_metrics().increment("requests_total", model=self.model, outcome="error")
+                # A reply cut short has no token count, so estimate what was generated
+                charge_tokens(self.session_key, estimate_tokens(self.text))
+        
+        if not self.text:
+            # Nothing was generated, surface the error as the reply like get_ai_response does
+            yield self.error or "I apologize, but I'm having trouble responding right now. Please try again."
+
+def stream_ai_response(model, conversation_history, max_retries=MAX_RETRIES, session_key=None,
+                       use_cache=True):
+    """Stream response from AI model chunk by chunk"""
+    return ResponseStream(model, conversation_history, max_retries, session_key, use_cache)
+
+def warm_up_payload(model):
+    """Request that loads a model without generating anything
     
-    return "I apologize, but I'm having trouble responding right now. Please try again."
+    It uses the same context size as chat requests, otherwise Ollama would
+    load the model again for the first real message.
+    """
+    return {"model": model, "prompt": "", "stream": False,
+            "options": {"num_ctx": model_context_tokens(model)}}
+
+def preload_models(models=PRELOAD_MODELS):
+    """Load the configured models in the background and keep them resident"""
+    pool = get_pool()
+    for model in models:
+        pool.preload(model, warm_up_payload(model))
+
+def warm_up_model(model):
+    """Start loading a model so the first message does not wait for it"""
+    get_pool().warm_up(model, warm_up_payload(model))
 
 def test_ai_connection(model):
-    """Test connection to AI service"""
-    test_response = get_ai_response(model, [{"role": "user", "text": "Hello"}])
-    return "Error" not in test_response
+    """Test connection to AI service with a cheap check that the model is installed"""
+    try:
+        response = get_pool().get("/api/tags", retries=1)
+        if response.status_code != 200:
+            return False
+        installed = {model_tag(m.get("name", "")) for m in response.json().get("models", [])}
+    except (requests.exceptions.RequestException, ValueError):
+        return False
+    return model_tag(model) in installed
+
+MODEL_STATE_ICONS = {"loaded": "🟢", "loading": "🟡", "unloaded": "⚪"}
+
+def on_model_change(session_key):
+    """Drop the chat's model context and start loading the new model"""
+    context_cache.invalidate(session_key)
+    warm_up_model(st.session_state.ai_model)
 
-def render_ai_settings():
+def render_ai_settings(session_key=None):
     """Render AI settings section"""
     st.markdown("### ⚙️ Settings")
-    model = st.selectbox("Choose AI Model", AVAILABLE_MODELS, 
-                       help="Select the AI model for responses")
+    if "ai_model" not in st.session_state:
+        # Prefer a model that is already in memory
+        pool = get_pool()
+        loaded = [m for m in AVAILABLE_MODELS if pool.model_state(m) == "loaded"]
+        preloaded = [m for m in PRELOAD_MODELS if m in AVAILABLE_MODELS]
+        st.session_state.ai_model = (loaded or preloaded or AVAILABLE_MODELS)[0]
+    model = st.selectbox("Choose AI Model", AVAILABLE_MODELS, key="ai_model",
+                       help="Select the AI model for responses",
+                       on_change=on_model_change, args=(session_key,))
+    # Shown beside the picker, not in its labels: a label change would reset the selection
+    states = {m: get_pool().model_state(m) for m in AVAILABLE_MODELS}
+    st.caption(" · ".join(f"{MODEL_STATE_ICONS[s]} {m}" for m, s in states.items())
+               + "  \n🟢 loaded, 🟡 loading, ⚪ not loaded")
     
     # Test connection
     if st.button("Test AI Connection"):
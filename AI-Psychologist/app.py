@@ -4,28 +4,192 @@ Imports and orchestrates all modules
 """
 
 import streamlit as st
+import threading
+import time
 from datetime import datetime
 
-# Import custom modules
-from auth import create_account_page, authenticate_user
-from chat_manager import (
-    ensure_directories, create_new_session, save_chat,
-    render_chat_sidebar, render_chat_messages
-)
-from ai_service import get_ai_response, render_ai_settings
+# Only what every page needs is imported here. The auth, chat and AI modules
+# are imported by the code paths that use them, so the login page does not
+# load the chat, AI and search modules and the libraries behind them
 from ui_components import (
     apply_custom_css, render_disclaimer, 
     render_chat_header, render_chat_input
 )
+from config import STREAM_RESPONSES
+
+@st.cache_resource(show_spinner=False)
+def start_preloading():
+    """Import the AI modules and start loading the configured models in the background, once per process"""
+    def preload():
+        from ai_service import preload_models
+        preload_models()
+    thread = threading.Thread(target=preload, name="preload", daemon=True)
+    thread.start()
+    return thread
 
 def initialize_session_state():
     """Initialize session state variables"""
+    from chat_manager import create_new_session
     if "current_chat" not in st.session_state:
         st.session_state.current_chat = create_new_session()
         st.session_state.chat_history = []
 
+def wait_then_stream(ticket, stream):
+    """Yield nothing until the queued request may run, then the AI response"""
+    from request_queue import wait_for_turn
+    from rate_limiter import get_rate_limiter
+    if not wait_for_turn(ticket):
+        # Timed out in the queue without using the model, so it doesn't count against the quota
+        get_rate_limiter().refund(ticket.username)
+        yield "Error: The AI service is busy right now. Please try again in a moment."
+        return
+    yield from stream
+
+def respond(username, model, chat_container):
+    """Queue the AI reply to the latest user message, show it and save the chat"""
+    from chat_manager import save_chat, render_chat_messages
+    from ai_service import get_ai_response, get_cached_response, stream_ai_response
+    from request_queue import get_scheduler, wait_for_turn, QueueFullError
+    from rate_limiter import get_rate_limiter, RateLimitError
+    session_key = (username, st.session_state.current_chat)
+    
+    # Cached replies don't need the model, so they skip the rate limit and the queue
+    immediate = get_cached_response(model, st.session_state.chat_history, session_key)
+    ticket = None
+    if immediate is None:
+        limiter = get_rate_limiter()
+        try:
+            limiter.acquire(username)
+            try:
+                ticket = get_scheduler().submit(username, model)
+            except QueueFullError:
+                # Turned away by the queue, so the request doesn't count against the quota
+                limiter.refund(username)
+                raise
+        except (RateLimitError, QueueFullError) as e:
+            # Rejected straight away instead of waiting for a timeout
+            immediate = f"Error: {e}"
+    if ticket is None:
+        st.session_state.chat_history.append({
+            "role": "ai", 
+            "text": immediate,
+            "timestamp": datetime.now().isoformat()
+        })
+        save_chat(username, st.session_state.current_chat, st.session_state.chat_history)
+        return
+    
+    with ticket:
+        if STREAM_RESPONSES:
+            # Stream the AI response into the chat area as it arrives
+            reply = {"role": "ai", "text": ""}
+            # The cache was already checked above, a second lookup would count the miss twice
+            stream = stream_ai_response(model, st.session_state.chat_history, session_key=session_key,
+                                        use_cache=False)
+            st.session_state.chat_history.append(reply)
+            try:
+                with chat_container:
+                    render_chat_messages(stream=wait_then_stream(ticket, stream))
+            finally:
+                # Runs on timeout or cancel too, so a partial reply is kept
+                reply["timestamp"] = datetime.now().isoformat()
+                if stream.partial:
+                    reply["partial"] = True
+                if not reply["text"]:
+                    st.session_state.chat_history.remove(reply)
+                save_chat(username, st.session_state.current_chat, st.session_state.chat_history)
+        else:
+            with chat_container:
+                render_chat_messages()
+                granted = wait_for_turn(ticket)
+            
+            # Show spinner while getting AI response
+            if granted:
+                with st.spinner("AI is thinking..."):
+                    ai_response = get_ai_response(model, st.session_state.chat_history, session_key=session_key,
+                                                  use_cache=False)
+            else:
+                limiter.refund(username)
+                ai_response = "Error: The AI service is busy right now. Please try again in a moment."
+            
+            # Add AI response
+            st.session_state.chat_history.append({
+                "role": "ai", 
+                "text": ai_response,
+                "timestamp": datetime.now().isoformat()
+            })
+            
+            # Save chat
+            save_chat(username, st.session_state.current_chat, st.session_state.chat_history)
+
+def chat_page(name, username, authenticator, run_started):
+    """Render the chat page of a logged-in user"""
+    from chat_manager import ensure_directories, flush_chats, render_chat_sidebar, render_chat_messages
+    from ai_service import render_ai_settings, speculative_prefill
+    from metrics import get_metrics, render_metrics_panel
+    
+    # Ensure required directories exist
+    ensure_directories()
+    
+    # Successful login
+    st.sidebar.success(f"Welcome {name}!")
+    authenticator.logout('Logout', 'sidebar', callback=lambda _: flush_chats(username))
+    render_metrics_panel(username)
+    
+    # Initialize session state
+    initialize_session_state()
+    
+    # Main layout
+    left_col, right_col = st.columns([1, 3])
+    
+    # ===================== LEFT SIDEBAR =====================
+    with left_col:
+        # Chat management
+        render_chat_sidebar(username)
+        
+        # AI settings
+        model = render_ai_settings(session_key=(username, st.session_state.current_chat))
+        
+        # Disclaimer
+        render_disclaimer()
+    
+    # ===================== RIGHT CHAT AREA =====================
+    with right_col:
+        # Chat header
+        render_chat_header()
+        
+        # Chat display area
+        chat_container = st.container()
+        
+        # Chat input area
+        user_input, send_button = render_chat_input()
+        
+        # Handle message sending
+        if send_button and user_input.strip():
+            # Add user message
+            st.session_state.chat_history.append({
+                "role": "user", 
+                "text": user_input.strip(),
+                "timestamp": datetime.now().isoformat()
+            })
+            
+            respond(username, model, chat_container)
+            st.rerun()
+        else:
+            with chat_container:
+                render_chat_messages()
+            # Reruns that call the model are covered by the generation metrics
+            get_metrics().observe("render_seconds", time.perf_counter() - run_started)
+            
+            # Warm the prompt cache while the user types, once per chat state
+            prefill_key = (st.session_state.current_chat, len(st.session_state.chat_history), model)
+            if st.session_state.get("prefilled") != prefill_key:
+                session_key = (username, st.session_state.current_chat)
+                if speculative_prefill(model, st.session_state.chat_history, session_key):
+                    st.session_state.prefilled = prefill_key
+
 def main():
     """Main application function"""
+    run_started = time.perf_counter()
     st.set_page_config(
         page_title="AI Psychologist", 
         layout="wide",
@@ -36,79 +200,24 @@ def main():
     # Apply custom styling
     apply_custom_css()
     
-    # Ensure required directories exist
-    ensure_directories()
+    # Start loading the configured models without holding up the first run
+    start_preloading()
     
     # Navigation
     page = st.sidebar.selectbox("Navigation", ["Login", "Create Account"])
     
     # ===================== CREATE ACCOUNT PAGE =====================
     if page == "Create Account":
+        from auth import create_account_page
         create_account_page()
 
     # ===================== LOGIN & CHAT PAGE =====================
     elif page == "Login":
+        from auth import authenticate_user
         auth_status, name, username, authenticator = authenticate_user()
 
         if auth_status:
-            # Successful login
-            st.sidebar.success(f"Welcome {name}!")
-            authenticator.logout('Logout', 'sidebar')
-            
-            # Initialize session state
-            initialize_session_state()
-            
-            # Main layout
-            left_col, right_col = st.columns([1, 3])
-            
-            # ===================== LEFT SIDEBAR =====================
-            with left_col:
-                # Chat management
-                render_chat_sidebar(username)
-                
-                # AI settings
-                model = render_ai_settings()
-                
-                # Disclaimer
-                render_disclaimer()
-            
-            # ===================== RIGHT CHAT AREA =====================
-            with right_col:
-                # Chat header
-                render_chat_header()
-                
-                # Chat display area
-                chat_container = st.container()
-                with chat_container:
-                    render_chat_messages()
-                
-                # Chat input area
-                user_input, send_button = render_chat_input()
-                
-                # Handle message sending
-                if send_button and user_input.strip():
-                    # Add user message
-                    st.session_state.chat_history.append({
-                        "role": "user", 
-                        "text": user_input.strip(),
-                        "timestamp": datetime.now().isoformat()
-                    })
-                    
-                    # Show spinner while getting AI response
-                    with st.spinner("AI is thinking..."):
-                        ai_response = get_ai_response(model, st.session_state.chat_history)
-                    
-                    # Add AI response
-                    st.session_state.chat_history.append({
-                        "role": "ai", 
-                        "text": ai_response,
-                        "timestamp": datetime.now().isoformat()
-                    })
-                    
-                    # Save chat
-                    save_chat(username, st.session_state.current_chat, st.session_state.chat_history)
-                    st.rerun()
-
+            chat_page(name, username, authenticator, run_started)
         elif auth_status is False:
             st.error("❌ Username or password is incorrect")
         elif auth_status is None:
@@ -5,39 +5,51 @@ Handles user registration, login, and password management
 
 import streamlit as st
 import streamlit_authenticator as stauth
-import yaml
-from yaml.loader import SafeLoader
-import bcrypt
-import os
-from config import USERS_FILE, DEFAULT_CONFIG, MIN_USERNAME_LENGTH, MIN_PASSWORD_LENGTH
+from config import MIN_USERNAME_LENGTH, MIN_PASSWORD_LENGTH
+from user_store import get_user_store
+from password_hasher import get_hasher
 
-def load_users():
-    """Load user configuration from YAML file"""
-    try:
-        if os.path.exists(USERS_FILE):
-            with open(USERS_FILE, 'r') as file:
-                return yaml.load(file, Loader=SafeLoader)
-        else:
-            # Create default config if file doesn't exist
-            save_users(DEFAULT_CONFIG)
-            return DEFAULT_CONFIG
-    except Exception as e:
-        st.error(f"Error loading users: {e}")
-        return None
+def add_user(username, name, password):
+    """Create an account; returns False if the username is taken"""
+    return get_user_store().add_user(username, {
+        'name': name,
+        'password': hash_password(password)
+    })
 
-def save_users(config):
-    """Save user configuration to YAML file"""
-    try:
-        with open(USERS_FILE, 'w') as file:
-            yaml.dump(config, file, default_flow_style=False)
+def hash_password(password):
+    """Hash password using bcrypt on the hashing worker pool"""
+    return get_hasher().hash(password)
+
+def upgrade_password_hash(username, hashed):
+    """Store a rehashed password, matching the username case-insensitively like the login form"""
+    store = get_user_store()
+    stored_username = next((u for u in store.users() if u.lower() == username), username)
+    store.update_user(stored_username, password=hashed)
+
+def use_password_hasher(authenticator):
+    """Route the authenticator's password checks through the hashing worker pool
+
+    A successful login also upgrades the stored hash in the background when
+    it was made with a different cost than BCRYPT_ROUNDS.
+    """
+    model = authenticator.authentication_controller.authentication_model
+    hasher = get_hasher()
+
+    def check_credentials(username, password):
+        user = model.credentials['usernames'].get(username)
+        if user is None:
+            return False
+        try:
+            if not hasher.verify(password, user['password']):
+                model._record_failed_login_attempts(username)
+                return False
+        except (TypeError, ValueError):
+            return None
+        if hasher.needs_rehash(user['password']):
+            hasher.rehash_later(password, lambda hashed: upgrade_password_hash(username, hashed))
         return True
-    except Exception as e:
-        st.error(f"Error saving users: {e}")
-        return False
 
-def hash_password(password):
-    """Hash password using bcrypt"""
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    model.check_credentials = check_credentials
 
 def validate_password(password):
     """Validate password strength"""
@@ -76,37 +88,45 @@ def create_account_page():
             elif not password_valid:
                 st.error(password_msg)
             else:
-                config = load_users()
-                if config is None:
-                    st.error("Unable to load user configuration.")
-                elif new_username in config['credentials']['usernames']:
-                    st.error("Username already exists. Please choose another.")
-                else:
-                    hashed_pw = hash_password(new_password)
-                    config['credentials']['usernames'][new_username] = {
-                        'name': new_name,
-                        'password': hashed_pw
-                    }
-                    if save_users(config):
+                try:
+                    if get_user_store().get_user(new_username) is not None:
+                        st.error("Username already exists. Please choose another.")
+                    # Checked again under the store's lock in case of a concurrent signup
+                    elif add_user(new_username, new_name, new_password):
                         st.success("Account created successfully! Please go to the login page.")
                         st.balloons()
                     else:
-                        st.error("Failed to create account. Please try again.")
+                        st.error("Username already exists. Please choose another.")
+                except Exception as e:
+                    st.error(f"Failed to create account. Please try again. ({e})")
 
-def authenticate_user():
-    """Handle user authentication and return auth status, name, username"""
-    config = load_users()
-    if config is None:
-        st.error("Cannot load user configuration. Please check your setup.")
-        return None, None, None
-    
+def create_authenticator(config, credentials):
+    """Build an authenticator over the stored accounts, checking passwords on the hashing worker pool"""
+    # Stored passwords are always bcrypt hashes, so skip stauth's per-user hash check.
+    # The login cookie is read from the request, so there is nothing to wait for
+    # before showing the form (stauth sleeps 0.7s on every logged-out run by default)
     authenticator = stauth.Authenticate(
-        config['credentials'],
+        credentials,
         config['cookie']['name'],
         config['cookie']['key'],
-        config['cookie']['expiry_days']
+        config['cookie']['expiry_days'],
+        auto_hash=False,
+        login_sleep_time=0
     )
+    use_password_hasher(authenticator)
+    return authenticator
 
+def authenticate_user():
+    """Handle user authentication and return auth status, name, username"""
+    try:
+        store = get_user_store()
+        config = store.config()
+        credentials = store.credentials()
+    except Exception as e:
+        st.error(f"Cannot load user configuration. Please check your setup. ({e})")
+        return None, None, None, None
+    
+    authenticator = create_authenticator(config, credentials)
     authenticator.login(location='main')
     
     # Access authentication status from session state
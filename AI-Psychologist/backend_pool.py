@@ -0,0 +1,264 @@
+"""
+Backend pool module for AI Psychologist app
+Balances model requests across several Ollama hosts
+"""
+
+import threading
+import time
+import requests
+from config import (
+    OLLAMA_HOSTS, BACKEND_EWMA_ALPHA, MODEL_LOAD_PENALTY, CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT, BACKEND_PROBE_INTERVAL, MAX_RETRIES, MODEL_LOAD_TIMEOUT
+)
+from ollama_client import OllamaClient, RETRY_STATUSES
+from metrics import get_metrics
+
+def model_tag(model):
+    """Normalize a model name the way Ollama reports it, e.g. phi3 -> phi3:latest"""
+    return model if ":" in model else f"{model}:latest"
+
+class Backend:
+    """One Ollama host with its load, latency and health"""
+
+    def __init__(self, host):
+        self.client = OllamaClient(host=host)
+        self.host = self.client.host
+        self.in_flight = 0
+        self.ewma_latency = None  # Seconds until response headers
+        self.loaded_models = set()
+        self.warming_models = set()  # Being loaded by a warm-up request
+        self.failures = 0
+        self.opened_at = None  # Set while the circuit is open
+
+    @property
+    def available(self):
+        return self.opened_at is None
+
+    def score(self, model):
+        """Expected cost of sending a request here, lower is better"""
+        latency = self.ewma_latency if self.ewma_latency is not None else 1.0
+        score = latency * (self.in_flight + 1)
+        if model_tag(model) not in self.loaded_models:
+            score += MODEL_LOAD_PENALTY
+        return score
+
+class BackendPool:
+    """Routes each request to the best Ollama host
+
+    Hosts are scored on in-flight requests, an exponentially weighted
+    average of recent latency and whether they already have the model
+    loaded, which is learned from ``/api/ps``. Repeated failures open a
+    host's circuit and take it out of rotation; a background prober polls
+    ``/api/ps`` on every host, closing the circuit again once an open host
+    answers after ``reset_timeout`` seconds. Preloaded models are warmed up
+    on every host, and the prober loads them again on idle hosts that have no
+    other model in memory (after a restart or keep_alive expiry); it never
+    loads them over a model in use, which could evict it.
+    """
+
+    def __init__(self, hosts=None, failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout=CIRCUIT_RESET_TIMEOUT, probe_interval=BACKEND_PROBE_INTERVAL):
+        self.backends = [Backend(host) for host in (hosts or OLLAMA_HOSTS)]
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._preload = {}  # model -> warm-up payload
+        if probe_interval:
+            threading.Thread(target=self._probe_loop, name="backend-prober", daemon=True).start()
+
+    def choose(self, model, exclude=()):
+        """Pick the backend for a request, falling back to open circuits if nothing else is left"""
+        with self._lock:
+            candidates = [b for b in self.backends if b.available and b not in exclude]
+            if not candidates:
+                candidates = [b for b in self.backends if b not in exclude] or self.backends
+                return min(candidates, key=lambda b: b.opened_at or 0)
+            return min(candidates, key=lambda b: b.score(model))
+
+    def post(self, model, path, payload, stream=False, retries=None):
+        """POST to the best backend, trying other hosts on failure
+
+        For streamed responses the backend counts as busy until the
+        response is closed.
+        """
+        retries = max(MAX_RETRIES if retries is None else retries, 1)
+        tried = []
+        for attempt in range(retries):
+            last_attempt = attempt == retries - 1
+            backend = self.choose(model, exclude=tried)
+            tried.append(backend)
+            if len(tried) == len(self.backends):
+                tried = []
+
+            with self._lock:
+                backend.in_flight += 1
+            try:
+                response = backend.client.post(path, payload, stream=stream, retries=1)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._finish(backend)
+                self.record_failure(backend)
+                if last_attempt:
+                    raise
+                get_metrics().increment("retries_total", endpoint=path, model=model)
+                time.sleep(backend.client.backoff(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES:
+                self._finish(backend)
+                self.record_failure(backend)
+                if last_attempt:
+                    return response
+                response.close()
+                get_metrics().increment("retries_total", endpoint=path, model=model)
+                time.sleep(backend.client.backoff(attempt))
+                continue
+
+            # Any answer means the host is up, but only a 200 means the model is loaded
+            self.record_success(backend, response.elapsed.total_seconds(),
+                                model if response.status_code == 200 else None)
+            if stream:
+                self._release_on_close(backend, response)
+            else:
+                self._finish(backend)
+            return response
+
+    def get(self, path, retries=None):
+        """GET from the best backend, e.g. for host-independent checks"""
+        backend = self.choose("")
+        return backend.client.get(path, retries=retries)
+
+    def warm_up(self, model, payload, idle_only=False):
+        """Load a model in the background on every available host that lacks it"""
+        tag = model_tag(model)
+        for backend in self.backends:
+            with self._lock:
+                if not backend.available or tag in backend.loaded_models or tag in backend.warming_models:
+                    continue
+                preloaded = {model_tag(m) for m in self._preload}
+                if idle_only and (backend.in_flight or (backend.loaded_models | backend.warming_models) - preloaded):
+                    continue
+                backend.warming_models.add(tag)
+            threading.Thread(target=self._warm, args=(backend, tag, payload),
+                             name="model-warm-up", daemon=True).start()
+
+    def preload(self, model, payload):
+        """Warm up a model now and whenever a host is found without it"""
+        with self._lock:
+            if model in self._preload:
+                return
+            self._preload[model] = payload
+        self.warm_up(model, payload)
+
+    def model_state(self, model):
+        """'loaded' if an available host has the model in memory, 'loading' while warming up, else 'unloaded'"""
+        tag = model_tag(model)
+        with self._lock:
+            available = [b for b in self.backends if b.available]
+            if any(tag in b.loaded_models for b in available):
+                return "loaded"
+            if any(tag in b.warming_models for b in available):
+                return "loading"
+        return "unloaded"
+
+    def record_success(self, backend, latency, model=None):
+        with self._lock:
+            if backend.ewma_latency is None:
+                backend.ewma_latency = latency
+            else:
+                backend.ewma_latency += BACKEND_EWMA_ALPHA * (latency - backend.ewma_latency)
+            backend.failures = 0
+            backend.opened_at = None
+            if model:
+                backend.loaded_models.add(model_tag(model))
+
+    def record_failure(self, backend):
+        with self._lock:
+            backend.failures += 1
+            if backend.failures >= self.failure_threshold and backend.opened_at is None:
+                backend.opened_at = time.monotonic()
+
+    def probe(self, backend):
+        """Refresh a host's loaded models and health from /api/ps"""
+        try:
+            response = backend.client.get("/api/ps", retries=1)
+            response.raise_for_status()
+            models = {m.get("name") for m in response.json().get("models", [])}
+        except (requests.exceptions.RequestException, ValueError):
+            self.record_failure(backend)
+            return False
+        with self._lock:
+            backend.loaded_models = models
+            backend.failures = 0
+            backend.opened_at = None
+        return True
+
+    def status(self):
+        """Snapshot of every backend for display"""
+        with self._lock:
+            return [{
+                "host": b.host,
+                "available": b.available,
+                "in_flight": b.in_flight,
+                "ewma_latency": b.ewma_latency,
+                "loaded_models": sorted(b.loaded_models),
+                "warming_models": sorted(b.warming_models),
+            } for b in self.backends]
+
+    def close(self):
+        """Stop the background prober"""
+        self._stopped.set()
+
+    def _finish(self, backend):
+        with self._lock:
+            backend.in_flight -= 1
+
+    def _warm(self, backend, tag, payload):
+        try:
+            # Not timed into the latency average, loading takes far longer than a request
+            response = backend.client.post("/api/generate", payload, retries=1, read_timeout=MODEL_LOAD_TIMEOUT)
+            loaded = response.status_code == 200
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            loaded = False
+            self.record_failure(backend)
+        with self._lock:
+            backend.warming_models.discard(tag)
+            if loaded:
+                backend.loaded_models.add(tag)
+
+    def _release_on_close(self, backend, response):
+        close = response.close
+        finished = []
+
+        def close_and_release():
+            if not finished:
+                finished.append(True)
+                self._finish(backend)
+            close()
+
+        response.close = close_and_release
+
+    def _probe_loop(self):
+        while not self._stopped.wait(self.probe_interval):
+            for backend in self.backends:
+                # Open circuits are only probed again after the reset timeout
+                if backend.opened_at is not None and time.monotonic() - backend.opened_at < self.reset_timeout:
+                    continue
+                self.probe(backend)
+            with self._lock:
+                preload = list(self._preload.items())
+            for model, payload in preload:
+                self.warm_up(model, payload, idle_only=True)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Get the process-wide backend pool"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BackendPool()
+    return _pool
\ No newline at end of file
@@ -0,0 +1,252 @@
+"""
+Behaviour checks for AI Psychologist benchmarks
+Runs the app against fake Ollama servers and checks caching, quotas, memory and failover
+"""
+
+import argparse
+import itertools
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from fake_ollama import FakeOllamaSettings, start_fake_ollama, stop_fake_ollama
+
+MODELS = ("mistral:latest", "phi3:latest", "nomic-embed-text:latest")
+CHAT_NUMBERS = itertools.count(1)
+
+def configure(urls, **settings):
+    """Point the app at the fake servers; must run before the app modules are imported"""
+    config.OLLAMA_HOST = urls[0]
+    config.OLLAMA_HOSTS = list(urls)
+    config.METRICS_PORT = None
+    config.PRELOAD_MODELS = []
+    config.SAVE_FLUSH_INTERVAL = 0
+    for name, value in settings.items():
+        setattr(config, name, value)
+
+def start_servers(count=1, **options):
+    """Start fake Ollama servers; returns the servers, their settings and their URLs"""
+    settings = [FakeOllamaSettings(models=MODELS, **options) for _ in range(count)]
+    started = [start_fake_ollama(s) for s in settings]
+    return [server for server, _ in started], settings, [url for _, url in started]
+
+def open_chat(username):
+    """A logged-in session of the app in a new chat, run once"""
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(APP_DIR, "app.py"), default_timeout=30)
+    at.session_state["authentication_status"] = True
+    at.session_state["name"] = username
+    at.session_state["username"] = username
+    # Chats are named by the second they start; these may start within one
+    at.session_state["current_chat"] = f"chat_{next(CHAT_NUMBERS)}.json"
+    at.session_state["chat_history"] = []
+    at.run()
+    return at
+
+def send(at, text):
+    at.text_area[0].input(text)
+    at.button(key="FormSubmitter:chat_form-Send Message").click()
+    at.run()
+    assert not at.exception, [e.value for e in at.exception]
+    return at.session_state.chat_history[-1]["text"]
+
+def check_response_cache(stream):
+    """A repeated opener is answered from the cache, with one lookup per turn"""
+    servers, settings, urls = start_servers()
+    configure(urls, STREAM_RESPONSES=stream, RATE_LIMIT_REQUESTS_PER_MINUTE=0)
+    from response_cache import get_response_cache
+
+    first = send(open_chat("alice"), "I feel anxious")
+    counters = dict(get_response_cache().counters)
+    assert (counters["hits"], counters["misses"], counters["stores"]) == (0, 1, 1), counters
+    sent = settings[0].requests
+
+    second = send(open_chat("bob"), "i feel ANXIOUS!")
+    counters = get_response_cache().counters
+    assert (counters["hits"], counters["misses"], counters["stores"]) == (1, 1, 1), counters
+    assert second == first, (first, second)
+    assert settings[0].requests == sent, "a cache hit still reached the model"
+
+def check_memory_isolation(stream):
+    """Past turns are only recalled for their own user, and replies using them are not cached"""
+    servers, settings, urls = start_servers()
+    configure(urls, STREAM_RESPONSES=stream, RATE_LIMIT_REQUESTS_PER_MINUTE=0,
+              LONG_TERM_MEMORY=True, MEMORY_MIN_SCORE=0.0)
+    import ai_service
+    from memory_index import get_memory
+    from response_cache import get_response_cache
+
+    prompts = []
+    build_request = ai_service.build_request
+
+    def spy(model, conversation_history, session_key=None, stream=False):
+        request, remembered = build_request(model, conversation_history, session_key, stream)
+        prompts.append((session_key[0], remembered, request.get("prompt", "")))
+        return request, remembered
+
+    ai_service.build_request = spy
+    alice = open_chat("alice")
+    send(alice, "My mother shouted at me about money again")
+    send(alice, "It makes me anxious")
+    deadline = time.monotonic() + 10
+    while len(get_memory().index("alice").entries) < 2 and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert len(get_memory().index("alice").entries) == 2, "alice's turns were never indexed"
+
+    prompts.clear()
+    stored = get_response_cache().counters["stores"]
+    send(open_chat("alice"), "I feel anxious about money")
+    send(open_chat("bob"), "I feel anxious about money")
+    (alice_user, alice_remembered, alice_prompt), (bob_user, bob_remembered, bob_prompt) = prompts
+    assert (alice_user, bob_user) == ("alice", "bob"), prompts
+    assert alice_remembered and "mother" in alice_prompt, "alice's own memories were not recalled"
+    assert not bob_remembered and "mother" not in bob_prompt, "alice's memories reached bob's prompt"
+    # Lookups are skipped while memory is on, but the cache may be read with it off later
+    assert get_response_cache().counters["stores"] == stored + 1, "alice's remembered reply was cached"
+
+def check_quota_refunds(stream, timeout):
+    """Messages the queue turns away, at once or after waiting, give their request quota back"""
+    servers, settings, urls = start_servers()
+    if timeout:
+        # Never granted a slot before the wait times out
+        configure(urls, STREAM_RESPONSES=stream, RATE_LIMIT_REQUESTS_PER_MINUTE=1,
+                  DEFAULT_MAX_IN_FLIGHT=0, QUEUE_WAIT_TIMEOUT=0.3)
+    else:
+        # Rejected at submit
+        configure(urls, STREAM_RESPONSES=stream, RATE_LIMIT_REQUESTS_PER_MINUTE=1, MAX_QUEUED_REQUESTS=0)
+
+    at = open_chat("alice")
+    replies = [send(at, text) for text in ("one", "two", "three")]
+    assert all("busy" in reply for reply in replies), replies
+    assert settings[0].requests == 0, "a turned away message reached the model"
+
+def check_stream_charge():
+    """A stream closed mid-reply is charged the tokens it generated, a finished one its eval_count"""
+    servers, settings, urls = start_servers(reply_tokens=20, tokens_per_second=1000)
+    configure(urls, RATE_LIMIT_TOKENS_PER_HOUR=1000)
+    from ai_service import stream_ai_response
+    from rate_limiter import get_rate_limiter
+
+    buckets = get_rate_limiter().store._buckets
+    history = [{"role": "user", "text": "Hello there", "timestamp": "2026-01-01T00:00:00"}]
+
+    stream = iter(stream_ai_response("mistral", history, session_key=("alice", "chat_a.json"), use_cache=False))
+    for _ in range(5):
+        next(stream)
+    stream.close()
+    charged = 1000 - buckets["tokens:alice"][0]
+    assert round(charged) == 5, charged
+
+    text = "".join(stream_ai_response("mistral", history, session_key=("bob", "chat_b.json"), use_cache=False))
+    assert text, "the stream returned nothing"
+    charged = 1000 - buckets["tokens:bob"][0]
+    assert round(charged) == 20, charged
+
+def check_failover():
+    """A failing host's circuit opens and requests move on, and the host is put back once it recovers"""
+    servers, settings, urls = start_servers(count=2)
+    configure(urls)
+    from backend_pool import BackendPool
+    payload = {"model": "mistral", "prompt": "Hello", "stream": False}
+
+    def prefer(backend):
+        # The fastest host with the model loaded, so it is tried first while available
+        backend.ewma_latency = 0.001
+        backend.loaded_models.add("mistral:latest")
+
+    # Answering 503: retried on the other host until the circuit opens (no prober: /api/ps still answers and would close it)
+    pool = BackendPool(urls, failure_threshold=2, probe_interval=0)
+    first, second = pool.backends
+    settings[0].error_rate = 1.0
+    for _ in range(3):
+        prefer(first)
+        assert pool.post("mistral", "/api/generate", payload).status_code == 200
+    assert not first.available, "the failing host is still in rotation"
+    failed = settings[0].requests
+    for _ in range(3):
+        prefer(first)
+        assert pool.post("mistral", "/api/generate", payload).status_code == 200
+    assert settings[0].requests == failed, "a request went to the open circuit"
+
+    # Unreachable: the same, then the prober puts it back once it answers again
+    settings[0].error_rate = 0.0
+    pool = BackendPool(urls, failure_threshold=2, reset_timeout=0.5, probe_interval=0.1)
+    first, second = pool.backends
+    port = servers[0].server_address[1]
+    stop_fake_ollama(servers[0])
+    for _ in range(3):
+        prefer(first)
+        assert pool.post("mistral", "/api/generate", payload).status_code == 200
+    assert not first.available, "the unreachable host is still in rotation"
+
+    start_fake_ollama(settings[0], port=port)
+    stop_fake_ollama(servers[1])
+    deadline = time.monotonic() + 5
+    while not (first.available and not second.available) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert first.available, "the recovered host was never put back"
+    assert not second.available, "the unreachable host is still in rotation"
+    for _ in range(3):
+        assert pool.post("mistral", "/api/generate", payload).status_code == 200
+    pool.close()
+
+CHECKS = {
+    "response_cache_stream": lambda: check_response_cache(True),
+    "response_cache_blocking": lambda: check_response_cache(False),
+    "memory_isolation_stream": lambda: check_memory_isolation(True),
+    "memory_isolation_blocking": lambda: check_memory_isolation(False),
+    "quota_refund_rejected_stream": lambda: check_quota_refunds(True, timeout=False),
+    "quota_refund_rejected_blocking": lambda: check_quota_refunds(False, timeout=False),
+    "quota_refund_timeout_stream": lambda: check_quota_refunds(True, timeout=True),
+    "quota_refund_timeout_blocking": lambda: check_quota_refunds(False, timeout=True),
+    "stream_charge": check_stream_charge,
+    "failover": check_failover,
+}
+
+def run_check(name):
+    """Run one check in a fresh working directory; the process exits with its outcome"""
+    workdir = tempfile.mkdtemp(prefix="ai-psychologist-check-")
+    try:
+        os.chdir(workdir)
+        CHECKS[name]()
+    finally:
+        os.chdir(APP_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the app's concurrency paths against fake Ollama servers")
+    parser.add_argument("checks", nargs="*", help=f"Checks to run (default: all): {', '.join(CHECKS)}")
+    parser.add_argument("--in-process", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    unknown = [name for name in args.checks if name not in CHECKS]
+    if unknown:
+        parser.error(f"unknown checks: {', '.join(unknown)}")
+
+    if args.in_process:
+        run_check(args.checks[0])
+        return 0
+
+    # Each check gets its own process, as the app keeps process-wide caches, pools and limiters
+    failed = []
+    for name in args.checks or CHECKS:
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), "--in-process", name],
+                                capture_output=True, text=True)
+        outcome = "ok" if result.returncode == 0 else "FAILED"
+        print(f"{name:<32} {outcome:<7} {time.perf_counter() - started:.1f} s")
+        if result.returncode != 0:
+            failed.append(name)
+            print(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.stdout)
+    print(f"{len(failed)} of {len(args.checks or CHECKS)} checks failed" if failed else "All checks passed")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
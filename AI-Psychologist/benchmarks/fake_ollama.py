@@ -0,0 +1,182 @@
+"""
+Fake Ollama server for AI Psychologist benchmarks
+Answers the Ollama API at a configurable speed without running a model
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIM = 64
+
+WORDS = ("I hear you and it makes sense to feel that way . Let us take a slow breath together "
+         "and look at what is weighing on you most right now").split()
+
+class FakeOllamaSettings:
+    """How the fake server behaves
+
+    ``latency`` is the delay before the first token (prompt evaluation),
+    ``tokens_per_second`` the generation speed and ``reply_tokens`` the reply
+    length. ``error_rate`` is the share of requests answered with a 503, and
+    ``cut_rate`` the share of streams that stop halfway without a final chunk.
+    """
+
+    def __init__(self, tokens_per_second=200.0, latency=0.05, reply_tokens=20,
+                 error_rate=0.0, cut_rate=0.0, models=("mistral:latest", "phi3:latest")):
+        self.tokens_per_second = tokens_per_second
+        self.latency = latency
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.cut_rate = cut_rate
+        self.models = list(models)
+        self.loaded = set()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings = FakeOllamaSettings()
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.connections.add(self.connection)
+
+    def finish(self):
+        self.server.connections.discard(self.connection)
+        super().finish()
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away, e.g. a cancelled prefill
+            pass
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self.send_json(200, {"models": [{"name": m} for m in self.settings.models]})
+        elif self.path == "/api/ps":
+            self.send_json(200, {"models": [{"name": m} for m in sorted(self.settings.loaded)]})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        settings = self.settings
+        with settings.lock:
+            settings.requests += 1
+        if self.path == "/api/embed":
+            self.send_json(200, {"model": payload.get("model", ""), "embeddings": [
+                self.embedding(text) for text in ([payload["input"]] if isinstance(payload.get("input"), str)
+                                                  else payload.get("input", []))]})
+            return
+        if self.path != "/api/generate":
+            self.send_json(404, {"error": "not found"})
+            return
+        if random.random() < settings.error_rate:
+            self.send_json(503, {"error": "server busy"})
+            return
+
+        model = payload.get("model", "")
+        with settings.lock:
+            settings.loaded.add(model if ":" in model else f"{model}:latest")
+        prompt_tokens = len(payload.get("prompt", "").split())
+        # num_predict 0 only evaluates the prompt
+        tokens = min(settings.reply_tokens, payload.get("options", {}).get("num_predict", settings.reply_tokens))
+        time.sleep(settings.latency)
+        started = time.perf_counter()
+
+        if not payload.get("stream", True):
+            time.sleep(tokens / settings.tokens_per_second)
+            self.send_json(200, self.final_chunk(model, " ".join(WORDS[i % len(WORDS)] for i in range(tokens)),
+                                                 prompt_tokens, tokens, started))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        cut_at = tokens // 2 if random.random() < settings.cut_rate else None
+        try:
+            for i in range(tokens):
+                if i == cut_at:
+                    self.close_connection = True
+                    return
+                time.sleep(1 / settings.tokens_per_second)
+                self.write_chunk({"model": model, "response": WORDS[i % len(WORDS)] + " ", "done": False})
+            self.write_chunk(self.final_chunk(model, "", prompt_tokens, tokens, started))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def write_chunk(self, data):
+        line = (json.dumps(data) + "\n").encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    @staticmethod
+    def embedding(text):
+        """Bag of hashed words, so texts that share words come out similar"""
+        vector = [0.0] * EMBEDDING_DIM
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % EMBEDDING_DIM] += 1.0
+        return vector
+
+    @staticmethod
+    def final_chunk(model, text, prompt_tokens, tokens, started):
+        duration = int((time.perf_counter() - started) * 1e9)
+        return {
+            "model": model, "response": text, "done": True,
+            "context": list(range(prompt_tokens + tokens)),
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": tokens, "eval_duration": max(duration, 1), "total_duration": max(duration, 1),
+        }
+
+def start_fake_ollama(settings=None, host="127.0.0.1", port=0):
+    """Start the fake server in a background thread; returns (server, base URL)"""
+    handler = type("Handler", (FakeOllamaHandler,), {"settings": settings or FakeOllamaSettings()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.connections = set()  # Open client connections, dropped by stop_fake_ollama
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def stop_fake_ollama(server):
+    """Stop the server and drop its open connections, as if the host went down"""
+    server.shutdown()
+    server.server_close()
+    for connection in list(server.connections):
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Ollama API")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--reply-tokens", type=int, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--cut-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server, url = start_fake_ollama(FakeOllamaSettings(
+        args.tokens_per_second, args.latency, args.reply_tokens, args.error_rate, args.cut_rate), port=args.port)
+    print(f"Fake Ollama listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
\ No newline at end of file
@@ -0,0 +1,237 @@
+"""
+Load test for AI Psychologist benchmarks
+Drives simulated users through signup, login, chat, save and reload against a fake Ollama server
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from fake_ollama import FakeOllamaSettings, start_fake_ollama
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the app against a fake Ollama server")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--model", default=config.AVAILABLE_MODELS[0])
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--reply-tokens", type=int, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--cut-rate", type=float, default=0.0)
+    parser.add_argument("--in-flight", type=int, default=config.DEFAULT_MAX_IN_FLIGHT,
+                        help="Concurrent model requests allowed per model")
+    parser.add_argument("--bcrypt-rounds", type=int, default=config.BCRYPT_ROUNDS)
+    parser.add_argument("--storage", default=config.CHAT_STORAGE_BACKEND, choices=("jsonl", "json", "sqlite"))
+    parser.add_argument("--memory", action="store_true", help="Turn on long-term memory (embeddings)")
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--max-turn-p95", type=float, help="Fail if the p95 chat turn takes longer (seconds)")
+    parser.add_argument("--max-error-rate", type=float, help="Fail if a larger share of turns fails")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory")
+    return parser.parse_args()
+
+def configure(args, ollama_url):
+    """Point the app at the fake server; must run before the app modules are imported"""
+    config.OLLAMA_HOST = ollama_url
+    config.OLLAMA_HOSTS = [ollama_url]
+    config.METRICS_PORT = None
+    config.QUEUE_WAIT_TIMEOUT = 300
+    config.DEFAULT_MAX_IN_FLIGHT = args.in_flight
+    config.MAX_QUEUED_REQUESTS = max(config.MAX_QUEUED_REQUESTS, args.users)
+    config.BCRYPT_ROUNDS = args.bcrypt_rounds
+    config.CHAT_STORAGE_BACKEND = args.storage
+    config.LONG_TERM_MEMORY = args.memory
+
+class SimulatedUser(threading.Thread):
+    """One user going through the whole app flow"""
+
+    def __init__(self, index, args, timings, errors, start_barrier):
+        super().__init__(name=f"user-{index}")
+        self.index = index
+        self.args = args
+        self.timings = timings
+        self.errors = errors
+        self.start_barrier = start_barrier
+        self.username = f"bench{index}"
+
+    def record(self, name, seconds):
+        self.timings.setdefault(name, []).append(seconds)
+
+    def run(self):
+        from auth import add_user, create_authenticator
+        from user_store import get_user_store
+        from chat_manager import create_new_session, save_chat, load_chat, list_sessions
+        from ai_service import stream_ai_response
+        from request_queue import get_scheduler
+
+        password = f"password-{self.index}"
+        self.start_barrier.wait()
+
+        started = time.perf_counter()
+        add_user(self.username, f"Bench User {self.index}", password)
+        self.record("signup", time.perf_counter() - started)
+
+        # What submitting the login form runs: the session's authenticator over the
+        # stored accounts, checking the password on the hashing worker pool
+        started = time.perf_counter()
+        store = get_user_store()
+        authenticator = create_authenticator(store.config(), store.credentials())
+        if not authenticator.authentication_controller.login(self.username, password):
+            self.errors.append(f"{self.username}: login failed")
+        self.record("login", time.perf_counter() - started)
+
+        chat = f"{os.path.splitext(create_new_session())[0]}_{self.index}.json"
+        history = []
+        for turn in range(self.args.turns):
+            history.append({"role": "user", "text": f"Message {turn} from user {self.index}: I feel stressed"})
+            started = time.perf_counter()
+            ticket = get_scheduler().submit(self.username, self.args.model)
+            with ticket:
+                if not ticket.wait(config.QUEUE_WAIT_TIMEOUT):
+                    self.errors.append(f"{self.username}: queue timeout")
+                    history.pop()
+                    continue
+                stream = stream_ai_response(self.args.model, history, session_key=(self.username, chat))
+                first_token = None
+                for _ in stream:
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+            self.record("turn", time.perf_counter() - started)
+            if first_token is not None:
+                self.record("first_token_incl_queue", first_token)
+            if stream.error or not stream.done:
+                self.errors.append(f"{self.username}: {stream.error or 'reply cut short'}")
+            history.append({"role": "ai", "text": stream.text or stream.error or ""})
+
+            started = time.perf_counter()
+            save_chat(self.username, chat, history)
+            self.record("save", time.perf_counter() - started)
+
+        started = time.perf_counter()
+        list_sessions(self.username)
+        reloaded = load_chat(self.username, chat)
+        self.record("reload", time.perf_counter() - started)
+        if len(reloaded) != len(history):
+            self.errors.append(f"{self.username}: reloaded {len(reloaded)} of {len(history)} messages")
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+def summarize(samples):
+    from metrics import percentile
+    ordered = sorted(samples)
+    return {"count": len(ordered), **{f"p{q}": percentile(ordered, q / 100) for q in (50, 95, 99)}}
+
+def run(args):
+    settings = FakeOllamaSettings(args.tokens_per_second, args.latency, args.reply_tokens,
+                                  args.error_rate, args.cut_rate)
+    server, url = start_fake_ollama(settings)
+    configure(args, url)
+
+    from chat_manager import ensure_directories
+    from metrics import get_metrics
+    from save_queue import get_save_queue
+    ensure_directories()
+
+    timings, errors = {}, []
+    barrier = threading.Barrier(args.users)
+    users = [SimulatedUser(i, args, timings, errors, barrier) for i in range(args.users)]
+    started = time.perf_counter()
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    # Write the queued saves so the storage size covers every turn
+    get_save_queue().flush()
+
+    turns = len(timings.get("turn", []))
+    model_metrics = {f"{h['name']}{'' if not h['labels'] else ' ' + json.dumps(h['labels'])}":
+                     {k: h[k] for k in ("count", "p50", "p95", "p99")}
+                     for h in get_metrics().snapshot()["histograms"]}
+    return {
+        "settings": {k: v for k, v in vars(args).items() if k not in ("json", "keep")},
+        "elapsed_seconds": elapsed,
+        "turns": turns,
+        "turns_per_second": turns / elapsed if elapsed else 0.0,
+        "error_rate": len(errors) / max(args.users * args.turns, 1),
+        "errors": errors[:20],
+        "fake_server_requests": settings.requests,
+        "timings": {name: summarize(samples) for name, samples in sorted(timings.items())},
+        "app_metrics": model_metrics,
+        "counters": get_metrics().snapshot()["counters"],
+        "storage_bytes": directory_size(config.CHAT_SESSIONS_DIR),
+        "users_file_bytes": os.path.getsize(config.USERS_FILE) if os.path.exists(config.USERS_FILE) else 0,
+    }
+
+def print_report(report):
+    def row(name, s):
+        cells = " ".join("     -  " if s[p] is None else f"{s[p] * 1000:8.1f}" for p in ("p50", "p95", "p99"))
+        print(f"  {name:<56} {s['count']:>6} {cells}")
+
+    print(f"{report['turns']} turns in {report['elapsed_seconds']:.2f} s "
+          f"({report['turns_per_second']:.2f} turns/s), error rate {report['error_rate']:.1%}")
+    print(f"  {'timing (ms)':<56} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, summary in report["timings"].items():
+        row(name, summary)
+    for name, summary in report["app_metrics"].items():
+        if name.startswith(("tokens_per_second", "prompt_tokens")):
+            values = " ".join("     -  " if summary[p] is None else f"{summary[p]:8.1f}" for p in ("p50", "p95", "p99"))
+            print(f"  {name:<56} {summary['count']:>6} {values}")
+        else:
+            row(name, summary)
+    for counter in report["counters"]:
+        print(f"  {counter['name']} {json.dumps(counter['labels'])}: {counter['value']}")
+    print(f"  chat storage on disk: {report['storage_bytes'] / 1024:.1f} KiB")
+    for error in report["errors"]:
+        print(f"  error: {error}")
+
+def check_budgets(args, report):
+    """Return the list of budgets the run went over"""
+    failures = []
+    turn_p95 = report["timings"].get("turn", {}).get("p95")
+    if args.max_turn_p95 is not None and (turn_p95 is None or turn_p95 > args.max_turn_p95):
+        failures.append(f"p95 turn time {turn_p95} s is over {args.max_turn_p95} s")
+    if args.max_error_rate is not None and report["error_rate"] > args.max_error_rate:
+        failures.append(f"error rate {report['error_rate']:.1%} is over {args.max_error_rate:.1%}")
+    return failures
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="ai-psychologist-bench-")
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    try:
+        report = run(args)
+    finally:
+        os.chdir(previous_dir)
+        if args.keep:
+            print(f"Working directory kept at {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    failures = check_budgets(args, report)
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -5,34 +5,63 @@ Handles chat session creation, loading, saving, and management
 
 import streamlit as st
 import os
-import json
+import html
+import logging
+import re
 from datetime import datetime
+from ai_service import invalidate_context, delete_summary
+from chat_store import get_store
+from save_queue import get_save_queue
+from search_index import get_search_index, HIT_START, HIT_END
+from memory_index import get_memory
+from config import CHAT_SESSIONS_DIR, MAX_DISPLAYED_CHATS, MESSAGE_WINDOW
 
-CHAT_SESSIONS_DIR = 'chat_sessions'
+logger = logging.getLogger(__name__)
 
 def ensure_directories():
     """Ensure required directories exist"""
     os.makedirs(CHAT_SESSIONS_DIR, exist_ok=True)
 
-def get_user_chat_dir(username):
-    """Get user-specific chat directory"""
-    user_dir = os.path.join(CHAT_SESSIONS_DIR, username)
-    os.makedirs(user_dir, exist_ok=True)
-    return user_dir
-
-def user_chat_path(username, filename):
-    """Get full path to user's chat file"""
-    return os.path.join(get_user_chat_dir(username), filename)
-
 def list_chats(username):
     """List all chat files for a user"""
     try:
-        user_dir = get_user_chat_dir(username)
-        files = [f for f in os.listdir(user_dir) if f.endswith(".json")]
-        return sorted(files, reverse=True)
+        return get_store().list_chats(username)
     except Exception:
         return []
 
+def list_sessions(username):
+    """List a user's chats with title, last update and message count, newest first"""
+    try:
+        sessions = {s["chat"]: s for s in get_store().list_sessions(username)}
+    except Exception:
+        sessions = {}
+    # Chats saved since the last flush are listed as they will be written
+    sessions.update((s["chat"], s) for s in get_save_queue().pending_sessions(username))
+    return [sessions[chat] for chat in sorted(sessions, reverse=True)]
+
+def search_sessions(sessions, query):
+    """Filter sessions whose title or date contains the query"""
+    query = query.strip().lower()
+    if not query:
+        return sessions
+    return [s for s in sessions
+            if query in s["title"].lower() or query in format_filename(s["chat"]).lower()]
+
+def search_messages(username, query):
+    """Full-text search of a user's messages, best matches first"""
+    try:
+        # Turns still queued for saving are not indexed yet
+        get_save_queue().flush(username)
+        return get_search_index().search(username, query)
+    except Exception as e:
+        st.error(f"Error searching chats: {e}")
+        return []
+
+def snippet_label(snippet):
+    """Markdown for a search snippet, with the matched words in bold"""
+    text = re.sub(r"([\\`*_{}\[\]()#+\-.!|<>~$])", r"\\\1", " ".join(snippet.split()))
+    return text.replace(HIT_START, "**").replace(HIT_END, "**")
+
 def format_filename(filename):
     """Format filename for display"""
     try:
@@ -41,20 +70,34 @@ def format_filename(filename):
     except ValueError:
         return filename.replace(".json", "")
 
-def load_chat(username, filename):
-    """Load chat history from file"""
+def load_chat(username, filename, tail=None):
+    """Load chat history from file, or only its last ``tail`` messages"""
     try:
-        with open(user_chat_path(username, filename), "r", encoding="utf-8") as f:
-            return json.load(f)
+        get_save_queue().flush(username, filename)
+        return get_store().load_chat(username, filename, tail)
     except Exception as e:
         st.error(f"Error loading chat: {e}")
         return []
 
 def save_chat(username, filename, history):
-    """Save chat history to file"""
+    """Queue chat history to be saved in the background"""
+    queue = get_save_queue()
+    try:
+        queue.save(username, filename, history)
+    except Exception as e:
+        st.error(f"Error saving chat: {e}")
+        return False
+    # Only this chat's own earlier write failing is reported here
+    error = queue.error(username, filename)
+    if error is not None:
+        st.error(f"Error saving chat: {error}")
+        return False
+    return True
+
+def flush_chats(username):
+    """Write a user's queued chat saves now, e.g. on session switch or logout"""
     try:
-        with open(user_chat_path(username, filename), "w", encoding="utf-8") as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
+        get_save_queue().flush(username)
         return True
     except Exception as e:
         st.error(f"Error saving chat: {e}")
@@ -67,11 +110,57 @@ def create_new_session():
 def delete_chat(username, filename):
     """Delete a chat file"""
     try:
-        os.remove(user_chat_path(username, filename))
-        return True
+        discarded = get_save_queue().discard(username, filename)
+        try:
+            get_store().delete_chat(username, filename)
+        except FileNotFoundError:
+            # A chat that was only queued has nothing on disk yet
+            if not discarded:
+                raise
     except Exception as e:
         st.error(f"Error deleting chat: {e}")
         return False
+    # The chat is gone now, so failed cleanup is logged rather than shown as a failed delete
+    try:
+        get_search_index().remove(username, filename)
+    except Exception as e:
+        logger.warning("Search index not updated for deleted chat %s/%s: %s", username, filename, e)
+    memory = get_memory()
+    if memory is not None:
+        try:
+            memory.forget(username, filename)
+        except Exception as e:
+            logger.warning("Long-term memory not updated for deleted chat %s/%s: %s", username, filename, e)
+    delete_summary(username, filename)
+    return True
+
+def open_chat(username, filename, message=None):
+    """Switch to a saved chat, scrolled back to ``message`` if given"""
+    flush_chats(username)
+    st.session_state.current_chat = filename
+    st.session_state.chat_history = load_chat(username, filename)
+    invalidate_context(username, filename)
+    st.session_state.search_hit = None
+    if message is not None:
+        windows = st.session_state.setdefault("message_windows", {})
+        windows[filename] = max(len(st.session_state.chat_history) - message, MESSAGE_WINDOW)
+        st.session_state.search_hit = (filename, message)
+
+def render_message_hits(username, query, sessions):
+    """Render full-text search results that open the chat at the matching message"""
+    hits = search_messages(username, query)
+    st.markdown("### Matching Messages")
+    if not hits:
+        st.caption("No messages match your search.")
+        return
+    titles = {s["chat"]: s["title"] for s in sessions}
+    for hit in hits:
+        date = format_filename(hit["chat"])
+        speaker = "You" if hit["role"] == "user" else "AI"
+        if st.button(f"{speaker}: {snippet_label(hit['snippet'])}", key=f"hit_{hit['chat']}_{hit['seq']}",
+                     help=f"{titles.get(hit['chat']) or date} · {date}"):
+            open_chat(username, hit["chat"], hit["seq"])
+            st.rerun()
 
 def render_chat_sidebar(username):
     """Render the chat sessions sidebar"""
@@ -80,50 +169,125 @@ def render_chat_sidebar(username):
     col1, col2 = st.columns(2)
     with col1:
         if st.button("➕ New Chat"):
+            flush_chats(username)
             st.session_state.current_chat = create_new_session()
             st.session_state.chat_history = []
             st.rerun()
     
     # List existing chats
-    chat_files = list_chats(username)
-    if chat_files:
+    sessions = list_sessions(username)
+    if sessions:
         st.markdown("### Recent Chats")
-        for file in chat_files[:10]:  # Show only last 10 chats
+        query = st.text_input("Search chats", key="chat_search", placeholder="Search by title or date...",
+                              label_visibility="collapsed")
+        matches = search_sessions(sessions, query)
+        
+        # Only the current page is formatted and rendered
+        pages = max((len(matches) - 1) // MAX_DISPLAYED_CHATS + 1, 1)
+        page = min(st.session_state.get("chat_page", 0), pages - 1)
+        start = page * MAX_DISPLAYED_CHATS
+        for session in matches[start:start + MAX_DISPLAYED_CHATS]:
+            file = session["chat"]
+            date = format_filename(file)
             col1, col2 = st.columns([3, 1])
             with col1:
-                if st.button(format_filename(file), key=f"load_{file}"):
-                    st.session_state.current_chat = file
-                    st.session_state.chat_history = load_chat(username, file)
+                if st.button(session["title"] or date, key=f"load_{file}",
+                             help=f"{date} · {session['message_count']} messages"):
+                    open_chat(username, file)
                     st.rerun()
             with col2:
                 if st.button("🗑️", key=f"delete_{file}", help="Delete chat"):
                     if delete_chat(username, file):
+                        invalidate_context(username, file)
                         if st.session_state.current_chat == file:
                             st.session_state.current_chat = create_new_session()
                             st.session_state.chat_history = []
                         st.rerun()
+        
+        if pages > 1:
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                if st.button("◀", key="chat_page_prev", disabled=page == 0):
+                    st.session_state.chat_page = page - 1
+                    st.rerun()
+            with col2:
+                st.caption(f"Page {page + 1} of {pages}")
+            with col3:
+                if st.button("▶", key="chat_page_next", disabled=page >= pages - 1):
+                    st.session_state.chat_page = page + 1
+                    st.rerun()
+        elif not matches:
+            st.caption("No chats match your search.")
+        
+        if query.strip():
+            render_message_hits(username, query, sessions)
+
+def message_html(role, text, highlight=False):
+    """Build the HTML block for a single chat message, escaping its text"""
+    body = html.escape(text).replace("\n", "<br>")
+    classes = "user-message" if role == "user" else "ai-message"
+    if highlight:
+        classes += " search-hit"
+    if role == "user":
+        return f"<div class='{classes}'><strong>You:</strong> {body}</div>"
+    return f"<div class='{classes}'><strong>AI:</strong> {body}</div>"
+
+def cached_message_html(index, entry):
+    """HTML for a message of the current chat, memoized by its position
+    
+    Chats only grow at the end, so a message's position identifies it; the
+    HTML is only rebuilt if the text at that position changed.
+    """
+    cache = st.session_state.get("message_html_cache")
+    if cache is None or cache["chat"] != st.session_state.current_chat:
+        cache = st.session_state.message_html_cache = {"chat": st.session_state.current_chat, "html": {}}
+    content = (entry["role"], entry["text"])
+    cached = cache["html"].get(index)
+    if cached is None or cached[0] != content:
+        cached = cache["html"][index] = (content, message_html(*content))
+    return cached[1]
 
-def render_chat_messages():
-    """Render chat messages in the chat area"""
-    if not st.session_state.chat_history:
+def show_earlier_messages(count):
+    """Grow the current chat's message window"""
+    st.session_state.message_windows[st.session_state.current_chat] = count + MESSAGE_WINDOW
+
+def render_chat_messages(stream=None):
+    """Render chat messages in the chat area
+    
+    Only the latest MESSAGE_WINDOW messages are shown, as a single block;
+    older ones are loaded on demand. When a response stream is given, the
+    last history entry is the AI reply being generated; its text is filled
+    in chunk by chunk as the stream arrives.
+    """
+    history = st.session_state.chat_history
+    if not history:
         st.markdown("""
         <div style='text-align: center; padding: 50px; color: #666;'>
         <h3>Welcome! How can I help you today?</h3>
         <p>Feel free to share what's on your mind. I'm here to listen and support you.</p>
         </div>
         """, unsafe_allow_html=True)
-    else:
-        for entry in st.session_state.chat_history:
-            role, text = entry["role"], entry["text"]
-            if role == "user":
-                st.markdown(f"""
-                <div class='user-message'>
-                <strong>You:</strong> {text}
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown(f"""
-                <div class='ai-message'>
-                <strong>AI:</strong> {text}
-                </div>
-                """, unsafe_allow_html=True)
\ No newline at end of file
+        return
+    
+    pending = history[-1] if stream is not None else None
+    settled = len(history) - 1 if pending is not None else len(history)
+    windows = st.session_state.setdefault("message_windows", {})
+    window = windows.get(st.session_state.current_chat, MESSAGE_WINDOW)
+    start = max(settled - window, 0)
+    if start:
+        st.button(f"⬆️ Show earlier messages ({start} more)", key="show_earlier_messages",
+                  on_click=show_earlier_messages, args=(window,))
+    if settled > start:
+        hit = st.session_state.get("search_hit")
+        hit = hit[1] if hit and hit[0] == st.session_state.current_chat else None
+        st.markdown("\n".join(message_html(history[i]["role"], history[i]["text"], highlight=True) if i == hit
+                              else cached_message_html(i, history[i]) for i in range(start, settled)),
+                    unsafe_allow_html=True)
+    
+    if pending is not None:
+        placeholder = st.empty()
+        placeholder.markdown(message_html("ai", "▌"), unsafe_allow_html=True)
+        for chunk in stream:
+            pending["text"] += chunk
+            placeholder.markdown(message_html("ai", pending["text"] + " ▌"), unsafe_allow_html=True)
+        placeholder.markdown(message_html("ai", pending["text"]), unsafe_allow_html=True)
\ No newline at end of file
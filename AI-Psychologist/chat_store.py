@@ -0,0 +1,511 @@
+"""
+Chat storage module for AI Psychologist app
+Storage backends that keep users' chat sessions
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from config import CHAT_SESSIONS_DIR, CHAT_STORAGE_BACKEND, CHAT_DB_FILE, CHAT_TITLE_LENGTH
+
+MESSAGE_FIELDS = ("role", "text", "timestamp")
+
+def session_title(history):
+    """Short title for a session, taken from its first user message"""
+    for message in history:
+        if message["role"] == "user":
+            text = " ".join(message["text"].split())
+            return text if len(text) <= CHAT_TITLE_LENGTH else text[:CHAT_TITLE_LENGTH - 1] + "…"
+    return ""
+
+def history_digest(messages):
+    """Fingerprint of a list of messages, to notice when any of them was edited"""
+    return hashlib.sha1(json.dumps(messages, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+def session_entry(chat, history, updated_at):
+    """Index entry describing a session"""
+    return {"chat": chat, "title": session_title(history),
+            "updated_at": updated_at, "message_count": len(history)}
+
+class SessionIndex:
+    """Per-user manifest of sessions for the file stores
+
+    The manifest is an append-only JSON Lines log next to the sessions: a
+    save or delete appends one line, and the log is compacted once it is
+    mostly stale lines. Parsed manifests are cached in memory and only read
+    again when the file changed on disk, so listing a user's sessions on a
+    rerun costs a single ``stat``. A missing manifest is rebuilt once from
+    the session files.
+    """
+
+    FILENAME = "sessions.index"
+
+    def __init__(self, store):
+        self.store = store
+        self._cache = {}  # username -> (file signature, {chat: entry}, log lines)
+        self._lock = threading.Lock()
+
+    def path(self, username):
+        return os.path.join(self.store.user_dir(username), self.FILENAME)
+
+    def sessions(self, username):
+        """Index entries of a user's sessions, newest first"""
+        with self._lock:
+            entries = self._load(username)[1]
+            return [entries[chat] for chat in sorted(entries, reverse=True)]
+
+    def update(self, username, chat, history):
+        with self._lock:
+            self._append(username, session_entry(chat, history, time.time()))
+
+    def remove(self, username, chat):
+        with self._lock:
+            self._append(username, {"chat": chat, "deleted": True})
+
+    def _signature(self, path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, username):
+        path = self.path(username)
+        cached = self._cache.get(username)
+        try:
+            signature = self._signature(path)
+        except OSError:
+            return self._rebuild(username)
+        if cached is not None and cached[0] == signature:
+            return cached
+
+        entries, lines = {}, 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                lines += 1
+                if record.get("deleted"):
+                    entries.pop(record["chat"], None)
+                else:
+                    entries[record["chat"]] = record
+        self._cache[username] = (signature, entries, lines)
+        return self._cache[username]
+
+    def _append(self, username, record):
+        _, entries, lines = self._load(username)
+        if record.get("deleted"):
+            entries.pop(record["chat"], None)
+        else:
+            entries[record["chat"]] = record
+        path = self.path(username)
+        if lines + 1 > 2 * len(entries) + 16:
+            self._write(username, entries)
+            return
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._cache[username] = (self._signature(path), entries, lines + 1)
+
+    def _write(self, username, entries):
+        path = self.path(username)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries.values()))
+        os.replace(tmp_path, path)
+        self._cache[username] = (self._signature(path), entries, len(entries))
+
+    def _rebuild(self, username):
+        entries = {}
+        for chat in self.store.list_chats(username):
+            try:
+                history = self.store.load_chat(username, chat)
+            except (OSError, ValueError):
+                continue
+            entries[chat] = session_entry(chat, history, self.store.modified_at(username, chat))
+        self._write(username, entries)
+        return self._cache[username]
+
+class JsonChatStore:
+    """One indented JSON file per session under ``<base_dir>/<username>/``"""
+
+    def __init__(self, base_dir=CHAT_SESSIONS_DIR):
+        self.base_dir = base_dir
+        self.index = SessionIndex(self)
+
+    def user_dir(self, username):
+        """Get user-specific chat directory"""
+        user_dir = os.path.join(self.base_dir, username)
+        os.makedirs(user_dir, exist_ok=True)
+        return user_dir
+
+    def path(self, username, chat):
+        """Get full path to user's chat file"""
+        return os.path.join(self.user_dir(username), chat)
+
+    def list_chats(self, username):
+        files = [f for f in os.listdir(self.user_dir(username)) if f.endswith(".json")]
+        return sorted(files, reverse=True)
+
+    def list_sessions(self, username):
+        """Title, update time and message count of each session, newest first"""
+        return self.index.sessions(username)
+
+    def modified_at(self, username, chat):
+        return os.path.getmtime(self.path(username, chat))
+
+    def load_chat(self, username, chat, tail=None):
+        with open(self.path(username, chat), "r", encoding="utf-8") as f:
+            history = json.load(f)
+        return history[-tail:] if tail else history
+
+    def save_chat(self, username, chat, history):
+        with open(self.path(username, chat), "w", encoding="utf-8") as f:
+            json.dump(history, f, ensure_ascii=False, indent=2)
+        self.index.update(username, chat, history)
+
+    def delete_chat(self, username, chat):
+        os.remove(self.path(username, chat))
+        self.index.remove(username, chat)
+
+class JsonlChatStore(JsonChatStore):
+    """One JSON Lines file per session, appended to a turn at a time
+
+    Each save appends only the new messages with a single write followed by
+    ``fsync``, so a crash can at worst lose a torn final line, which is
+    skipped on load. Edits and deletions of earlier messages, noticed from a
+    digest of the messages on disk, trigger a compaction that rewrites the
+    file atomically. Sessions are still named
+    ``chat_<timestamp>.json``; legacy ``.json`` files are read as before and
+    converted on their next save.
+    """
+
+    READ_BLOCK = 64 * 1024
+
+    def __init__(self, base_dir=CHAT_SESSIONS_DIR):
+        super().__init__(base_dir)
+        self._written = {}  # (username, chat) -> (message count, digest of those messages) on disk
+        self._lock = threading.Lock()
+
+    def jsonl_path(self, username, chat):
+        """Get the JSON Lines file of a session"""
+        return os.path.splitext(self.path(username, chat))[0] + ".jsonl"
+
+    def list_chats(self, username):
+        chats = set()
+        for f in os.listdir(self.user_dir(username)):
+            if f.endswith(".jsonl"):
+                chats.add(f[:-1])
+            elif f.endswith(".json"):
+                chats.add(f)
+        return sorted(chats, reverse=True)
+
+    def iter_messages(self, username, chat):
+        """Yield a session's messages one at a time without loading the whole file"""
+        path = self.jsonl_path(username, chat)
+        if not os.path.exists(path):
+            yield from super().load_chat(username, chat)
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                message = self._parse(line)
+                if message is not None:
+                    yield message
+
+    def load_chat(self, username, chat, tail=None):
+        if tail:
+            return self._read_tail(username, chat, tail)
+        return list(self.iter_messages(username, chat))
+
+    def save_chat(self, username, chat, history):
+        key = (username, chat)
+        with self._lock:
+            written, digest = self._written.get(key) or self._scan(username, chat)
+            prefix = history_digest(history[:written]) if written is not None and written <= len(history) else None
+            if prefix is None or prefix != digest or self._torn(username, chat):
+                self._compact(username, chat, history)
+            elif len(history) > written:
+                lines = "".join(json.dumps(m, ensure_ascii=False) + "\n" for m in history[written:])
+                with open(self.jsonl_path(username, chat), "a", encoding="utf-8") as f:
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._written[key] = (len(history), prefix if written == len(history) else history_digest(history))
+        self.index.update(username, chat, history)
+
+    def delete_chat(self, username, chat):
+        with self._lock:
+            self._written.pop((username, chat), None)
+            removed = False
+            for path in (self.jsonl_path(username, chat), self.path(username, chat)):
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed = True
+        if not removed:
+            raise FileNotFoundError(f"No chat named {chat}")
+        self.index.remove(username, chat)
+
+    def modified_at(self, username, chat):
+        path = self.jsonl_path(username, chat)
+        return os.path.getmtime(path if os.path.exists(path) else self.path(username, chat))
+
+    def compact(self, username, chat):
+        """Rewrite a session file, dropping torn lines and legacy leftovers"""
+        with self._lock:
+            history = self.load_chat(username, chat)
+            self._compact(username, chat, history)
+            self._written[(username, chat)] = (len(history), history_digest(history))
+
+    def _compact(self, username, chat, history):
+        path = self.jsonl_path(username, chat)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(m, ensure_ascii=False) + "\n" for m in history))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        legacy_path = self.path(username, chat)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+    def _torn(self, username, chat):
+        """True if the file ends in a partial line that an append would run into"""
+        try:
+            with open(self.jsonl_path(username, chat), "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) != b"\n"
+        except OSError:
+            return False  # Missing or empty file
+
+    def _scan(self, username, chat):
+        """Count and digest the messages on disk; only needed once per session and process"""
+        path = self.jsonl_path(username, chat)
+        if os.path.exists(path):
+            messages = list(self.iter_messages(username, chat))
+            return len(messages), history_digest(messages)
+        if os.path.exists(self.path(username, chat)):
+            # A legacy file is converted by a compaction on its first save
+            return None, None
+        return 0, None
+
+    def _read_tail(self, username, chat, tail):
+        """Read the last ``tail`` messages by scanning the file backwards"""
+        path = self.jsonl_path(username, chat)
+        if not os.path.exists(path):
+            return super().load_chat(username, chat, tail)
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b""
+            while position > 0 and data.count(b"\n") <= tail:
+                step = min(self.READ_BLOCK, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+        lines = data.split(b"\n")
+        if position > 0:
+            lines = lines[1:]  # First line may be cut in half
+        messages = [m for m in (self._parse(line.decode("utf-8")) for line in lines) if m is not None]
+        return messages[-tail:]
+
+    @staticmethod
+    def _parse(line):
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None  # Torn write from a crash
+
+class SQLiteChatStore:
+    """Sessions and messages in one SQLite database in WAL mode
+
+    Saving only inserts the messages that are new since the last save, so a
+    turn costs the same however long the chat is. The whole session is only
+    rewritten when earlier messages changed, which a digest of the stored
+    messages kept with the session shows.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        username TEXT NOT NULL,
+        chat TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        message_count INTEGER NOT NULL DEFAULT 0,
+        title TEXT NOT NULL DEFAULT '',
+        digest TEXT,
+        PRIMARY KEY (username, chat)
+    );
+    CREATE INDEX IF NOT EXISTS sessions_by_user_updated ON sessions (username, updated_at);
+    CREATE TABLE IF NOT EXISTS messages (
+        username TEXT NOT NULL,
+        chat TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        text TEXT NOT NULL,
+        timestamp TEXT,
+        extra TEXT,
+        PRIMARY KEY (username, chat, seq)
+    );
+    """
+
+    def __init__(self, db_path=CHAT_DB_FILE):
+        self.db_path = db_path
+        self._local = threading.local()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self.connection()
+        conn.executescript(self.SCHEMA)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(sessions)")]
+        if "title" not in columns:
+            # Databases created before session titles were indexed
+            with conn:
+                conn.execute("ALTER TABLE sessions ADD COLUMN title TEXT NOT NULL DEFAULT ''")
+        if "digest" not in columns:
+            # Databases created before message digests were kept
+            with conn:
+                conn.execute("ALTER TABLE sessions ADD COLUMN digest TEXT")
+
+    def connection(self):
+        """Get this thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def list_chats(self, username):
+        rows = self.connection().execute(
+            "SELECT chat FROM sessions WHERE username = ? ORDER BY chat DESC", (username,))
+        return [row[0] for row in rows]
+
+    def list_sessions(self, username):
+        """Title, update time and message count of each session, newest first"""
+        rows = self.connection().execute(
+            "SELECT chat, title, updated_at, message_count FROM sessions "
+            "WHERE username = ? ORDER BY chat DESC", (username,))
+        return [{"chat": chat, "title": title, "updated_at": updated_at, "message_count": count}
+                for chat, title, updated_at, count in rows]
+
+    def load_chat(self, username, chat, tail=None):
+        conn = self.connection()
+        row = conn.execute("SELECT message_count FROM sessions WHERE username = ? AND chat = ?",
+                           (username, chat)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"No chat named {chat}")
+        first = max(row[0] - tail, 0) if tail else 0
+        rows = conn.execute(
+            "SELECT role, text, timestamp, extra FROM messages "
+            "WHERE username = ? AND chat = ? AND seq >= ? ORDER BY seq", (username, chat, first))
+        return [self._to_message(row) for row in rows]
+
+    def save_chat(self, username, chat, history):
+        conn = self.connection()
+        now = time.time()
+        with conn:
+            row = conn.execute("SELECT message_count, digest FROM sessions WHERE username = ? AND chat = ?",
+                               (username, chat)).fetchone()
+            stored, digest = row if row else (0, None)
+            if row is None:
+                conn.execute("INSERT INTO sessions (username, chat, created_at, updated_at) "
+                             "VALUES (?, ?, ?, ?)", (username, chat, now, now))
+            if stored and not self._same_messages(conn, username, chat, stored, digest, history):
+                # Earlier messages changed, rewrite the session
+                conn.execute("DELETE FROM messages WHERE username = ? AND chat = ?", (username, chat))
+                stored = 0
+            conn.executemany(
+                "INSERT INTO messages (username, chat, seq, role, text, timestamp, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(username, chat, seq) + self._to_row(m)
+                 for seq, m in enumerate(history[stored:], start=stored)])
+            conn.execute("UPDATE sessions SET updated_at = ?, message_count = ?, title = ?, digest = ? "
+                         "WHERE username = ? AND chat = ?",
+                         (now, len(history), session_title(history), history_digest(history), username, chat))
+
+    def delete_chat(self, username, chat):
+        conn = self.connection()
+        with conn:
+            deleted = conn.execute("DELETE FROM sessions WHERE username = ? AND chat = ?",
+                                   (username, chat)).rowcount
+            conn.execute("DELETE FROM messages WHERE username = ? AND chat = ?", (username, chat))
+        if not deleted:
+            raise FileNotFoundError(f"No chat named {chat}")
+
+    def _same_messages(self, conn, username, chat, count, digest, history):
+        """True if the first ``count`` messages of ``history`` are the ones stored"""
+        if count > len(history):
+            return False
+        if digest is None:
+            # Saved before digests were kept, compare the stored messages once
+            rows = conn.execute("SELECT role, text, timestamp, extra FROM messages "
+                                "WHERE username = ? AND chat = ? ORDER BY seq", (username, chat))
+            return [self._to_message(row) for row in rows] == history[:count]
+        return history_digest(history[:count]) == digest
+
+    @staticmethod
+    def _to_row(message):
+        extra = {k: v for k, v in message.items() if k not in MESSAGE_FIELDS}
+        return (message["role"], message["text"], message.get("timestamp"),
+                json.dumps(extra, ensure_ascii=False) if extra else None)
+
+    @staticmethod
+    def _to_message(row):
+        role, text, timestamp, extra = row
+        message = {"role": role, "text": text}
+        if timestamp is not None:
+            message["timestamp"] = timestamp
+        if extra:
+            message.update(json.loads(extra))
+        return message
+
+def create_store(backend=CHAT_STORAGE_BACKEND):
+    """Create the chat store configured by CHAT_STORAGE_BACKEND"""
+    if backend == "sqlite":
+        return SQLiteChatStore()
+    if backend == "jsonl":
+        return JsonlChatStore()
+    if backend == "json":
+        return JsonChatStore()
+    raise ValueError(f"Unknown chat storage backend: {backend}")
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Get the process-wide chat store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store()
+    return _store
+
+def migrate_json_to_sqlite(json_dir=CHAT_SESSIONS_DIR, db_path=CHAT_DB_FILE):
+    """Copy every file-based chat session into the SQLite store; returns the number copied"""
+    source = JsonlChatStore(json_dir)
+    target = SQLiteChatStore(db_path)
+    migrated = 0
+    for username in sorted(os.listdir(json_dir)):
+        if not os.path.isdir(os.path.join(json_dir, username)):
+            continue
+        for chat in source.list_chats(username):
+            target.save_chat(username, chat, source.load_chat(username, chat))
+            path = source.jsonl_path(username, chat)
+            mtime = os.path.getmtime(path if os.path.exists(path) else source.path(username, chat))
+            with target.connection() as conn:
+                conn.execute("UPDATE sessions SET created_at = ?, updated_at = ? "
+                             "WHERE username = ? AND chat = ?", (mtime, mtime, username, chat))
+            migrated += 1
+    return migrated
+
+if __name__ == "__main__":
+    # python chat_store.py [json_dir] [db_path]
+    count = migrate_json_to_sqlite(*sys.argv[1:3])
+    print(f"Migrated {count} chat sessions")
\ No newline at end of file
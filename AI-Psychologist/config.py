@@ -6,10 +6,39 @@ Contains all configuration constants and settings
 # File paths
 USERS_FILE = 'users.yaml'
 CHAT_SESSIONS_DIR = 'chat_sessions'
+CHAT_DB_FILE = 'chat_sessions/chats.db'
+SEARCH_DB_FILE = 'chat_sessions/search.db'  # Full-text index of messages, for any storage backend
+USERS_DB_FILE = 'users.db'
+
+# User store backend: 'yaml' (USERS_FILE) or 'sqlite' (USERS_DB_FILE, imports USERS_FILE once)
+USER_STORE_BACKEND = 'yaml'
+
+# Chat storage backend: 'jsonl' (append-only file per session), 'json' (legacy
+# rewrite-on-save files) or 'sqlite' (CHAT_DB_FILE)
+CHAT_STORAGE_BACKEND = 'jsonl'
+
+# Chat turns are written by a background thread: repeated saves of a session
+# are coalesced and flushed at most this many seconds later (this bounds what a
+# crash can lose), on session switch and on logout. 0 saves on the request path.
+SAVE_FLUSH_INTERVAL = 2.0
 
 # AI Service settings
-OLLAMA_API = "http://localhost:11434/api/generate"
+OLLAMA_HOST = "http://localhost:11434"
+OLLAMA_API = f"{OLLAMA_HOST}/api/generate"
+OLLAMA_KEEP_ALIVE = "30m"  # How long Ollama keeps a model loaded after a request
+HTTP_POOL_SIZE = 10  # Pooled keep-alive connections to Ollama
+
+# Ollama hosts to balance requests across, OLLAMA_HOST alone by default
+OLLAMA_HOSTS = [OLLAMA_HOST]
+BACKEND_EWMA_ALPHA = 0.3  # Weight of the newest latency sample
+MODEL_LOAD_PENALTY = 10  # Seconds added to hosts that don't have the model loaded
+CIRCUIT_FAILURE_THRESHOLD = 3  # Consecutive failures before a host is taken out
+CIRCUIT_RESET_TIMEOUT = 30  # Seconds before a failed host is probed again
+BACKEND_PROBE_INTERVAL = 15  # Seconds between /api/ps polls
 AVAILABLE_MODELS = ["mistral:latest", "phi3", "llama2", "codellama"]
+# Loaded at startup and reloaded if evicted; every resident model needs its own memory on the host
+PRELOAD_MODELS = ["mistral:latest"]
+MODEL_LOAD_TIMEOUT = 300  # Read timeout while a model is loaded into memory
 
 # Authentication settings
 DEFAULT_CONFIG = {
@@ -48,11 +77,97 @@ AI:"""
 MIN_USERNAME_LENGTH = 3
 MIN_PASSWORD_LENGTH = 6
 
+# Password hashing: bcrypt cost factor (each +1 doubles the work) and the number
+# of hashes that may run at once; older hashes are upgraded on the next login
+BCRYPT_ROUNDS = 12
+PASSWORD_HASH_WORKERS = 2
+
 # API settings
-AI_REQUEST_TIMEOUT = 30
+AI_CONNECT_TIMEOUT = 3.05
+AI_REQUEST_TIMEOUT = 30  # Read timeout, i.e. the longest wait for the next bytes
+ENDPOINT_READ_TIMEOUTS = {
+    "/api/tags": 5,
+    "/api/ps": 5
+}
 MAX_RETRIES = 3
+RETRY_BACKOFF_BASE = 0.5  # Seconds, doubled on each retry with random jitter
+RETRY_BACKOFF_MAX = 8
+
+# Request queue (in front of the model backend)
+MAX_QUEUED_REQUESTS = 32  # Further requests are rejected at once
+MAX_QUEUED_PER_USER = 1
+MAX_IN_FLIGHT_PER_USER = 1
+MAX_IN_FLIGHT_PER_MODEL = {}  # e.g. {"phi3": 4}; match OLLAMA_NUM_PARALLEL
+DEFAULT_MAX_IN_FLIGHT = 1
+QUEUE_WAIT_TIMEOUT = 120  # Seconds a request may wait for a free slot
+
+# Rate limits on model usage, as token buckets (0 turns a limit off). Each
+# user may send RATE_LIMIT_REQUESTS_PER_MINUTE requests in a burst, refilled
+# over a minute; generated tokens are charged after each reply. The 'memory'
+# backend is shared by the sessions of one process, 'sqlite' (RATE_LIMIT_DB_FILE)
+# by several app processes.
+RATE_LIMIT_REQUESTS_PER_MINUTE = 10
+RATE_LIMIT_TOKENS_PER_HOUR = 20000
+RATE_LIMIT_GLOBAL_REQUESTS_PER_MINUTE = 120  # All users together
+RATE_LIMIT_BACKEND = 'memory'
+RATE_LIMIT_DB_FILE = 'rate_limits.db'
+
+# Speculative prefill (opt-in): while the user types, the chat so far is
+# evaluated so Ollama's prompt cache is warm for the next turn. Only runs
+# while no real request is queued or running, and is cancelled when one arrives.
+SPECULATIVE_PREFILL = False
+PREFILL_MIN_INTERVAL = 20  # Seconds between prefills for one user
+PREFILL_MAX_IN_FLIGHT = 1  # Prefills running at once across all users
+
+# Response cache for repeated prompts such as conversation openers
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_MAX_ENTRIES = 512
+RESPONSE_CACHE_MAX_BYTES = 4_000_000
+RESPONSE_CACHE_TTL = 24 * 3600  # Seconds
+RESPONSE_CACHE_MAX_TEMPERATURE = 0.8  # Sampled replies above this are never cached
+RESPONSE_CACHE_MAX_TURNS = 1  # Longest conversation cached when sampling (openers only)
+RESPONSE_CACHE_DIR = None  # e.g. 'response_cache' to keep entries across restarts
+RESPONSE_CACHE_MAX_DISK_ENTRIES = 10_000
 AI_TEMPERATURE = 0.7
 AI_TOP_P = 0.9
+STREAM_RESPONSES = True  # Show replies token by token as they are generated
+
+# Model context reuse (only the new user turn is evaluated on a cache hit)
+CONTEXT_CACHE_MAX_SESSIONS = 64
+CONTEXT_CACHE_MAX_TOKENS = 500_000  # Total context tokens kept across sessions
+
+# Context window budget per model, older turns are folded into a rolling summary
+MODEL_CONTEXT_TOKENS = {
+    "mistral:latest": 8192,
+    "phi3": 4096,
+    "llama2": 4096,
+    "codellama": 16384
+}
+DEFAULT_CONTEXT_TOKENS = 4096
+RESPONSE_TOKEN_RESERVE = 512  # Room left for the reply
+SUMMARY_MAX_TOKENS = 300
+
+# Long-term memory (opt-in): finished turns are embedded with EMBEDDING_MODEL
+# through Ollama (run `ollama pull nomic-embed-text` first) into a vector index
+# per user, and the turns from the user's other chats most similar to a new
+# message are added to its prompt.
+LONG_TERM_MEMORY = False
+EMBEDDING_MODEL = "nomic-embed-text"
+MEMORY_TOP_K = 3  # Past turns added to a prompt at most
+MEMORY_MIN_SCORE = 0.5  # Cosine similarity a past turn needs to be added
+MEMORY_MAX_TOKENS = 300  # Prompt room for past turns
+MEMORY_EMBED_BATCH = 32  # Texts per embedding request
+MEMORY_SEARCH_BATCH = 8192  # Vectors scored at a time
 
 # Chat settings
-MAX_DISPLAYED_CHATS = 10
\ No newline at end of file
+MAX_DISPLAYED_CHATS = 10  # Chats per sidebar page
+CHAT_TITLE_LENGTH = 40
+MESSAGE_WINDOW = 30  # Latest messages shown; older ones load on demand in steps of this size
+SEARCH_RESULTS_LIMIT = 20  # Messages listed for a sidebar search
+
+# Metrics: percentiles cover the latest METRICS_WINDOW samples of each series;
+# /metrics (Prometheus) and /metrics.json are served on METRICS_PORT (None disables)
+METRICS_WINDOW = 1000
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464
+ADMIN_USERS = []  # Usernames that see the metrics panel in the sidebar
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+Memory index module for AI Psychologist app
+Embeds past turns and finds the ones relevant to a new message
+"""
+
+import logging
+import os
+import threading
+from chat_store import get_store
+from metrics import get_metrics
+from config import CHAT_SESSIONS_DIR, LONG_TERM_MEMORY, EMBEDDING_MODEL, MEMORY_TOP_K, MEMORY_MIN_SCORE
+
+logger = logging.getLogger(__name__)
+
+def turn_texts(history, start=0):
+    """``(position, text)`` of every finished exchange from ``start`` on"""
+    turns = []
+    for i in range(start, len(history) - 1):
+        message, reply = history[i], history[i + 1]
+        if message["role"] == "user" and reply["role"] == "ai" and not reply["text"].startswith("Error:"):
+            turns.append((i, f"User: {message['text']}\nAI: {reply['text']}"))
+    return turns
+
+class LongTermMemory:
+    """Per-user vector indexes of past turns, filled in the background
+
+    Saved chats are handed to ``remember`` and embedded by a background
+    thread, a batch of new turns per request; a user's chats saved before
+    their index existed are caught up the first time it is opened.
+    ``recall`` embeds the new message and returns the most similar turns
+    from the user's other chats. The vector indexes (and numpy) are only
+    imported once memory is used, so the feature costs nothing while off.
+    """
+
+    def __init__(self, base_dir=CHAT_SESSIONS_DIR, model=EMBEDDING_MODEL, top_k=MEMORY_TOP_K,
+                 min_score=MEMORY_MIN_SCORE):
+        self.base_dir = base_dir
+        self.model = model
+        self.top_k = top_k
+        self.min_score = min_score
+        self._indexes = {}
+        self._pending = {}  # (username, chat) -> history, or (username, None) to catch up
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        threading.Thread(target=self._run, name="memory-index", daemon=True).start()
+
+    def index(self, username):
+        """Get a user's vector index"""
+        from vector_index import VectorIndex
+        with self._lock:
+            index = self._indexes.get(username)
+            if index is None:
+                index = self._indexes[username] = VectorIndex(
+                    os.path.join(self.base_dir, username, "memory"), self.model)
+                self._pending.setdefault((username, None), None)
+                self._wake.set()
+            return index
+
+    def remember(self, username, chat, history):
+        """Queue a saved chat's new turns to be embedded"""
+        with self._lock:
+            self._pending[(username, chat)] = list(history)
+        self._wake.set()
+
+    def forget(self, username, chat):
+        """Remove a deleted chat's turns"""
+        with self._lock:
+            self._pending.pop((username, chat), None)
+        self.index(username).remove_chat(chat)
+
+    def recall(self, username, chat, text):
+        """Texts of the user's past turns from other chats that are most relevant to ``text``"""
+        from vector_index import embed_texts
+        index = self.index(username)
+        if not any(c != chat for c in index.progress):
+            return []
+        hits = index.search(embed_texts([text], self.model), self.top_k, exclude_chat=chat)[0]
+        return [entry["text"] for score, entry in hits if score >= self.min_score]
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                jobs, self._pending = self._pending, {}
+            for (username, chat), history in jobs.items():
+                try:
+                    if chat is None:
+                        self._catch_up(username)
+                    else:
+                        self._add_turns(username, chat, history)
+                except Exception as e:
+                    get_metrics().increment("memory_errors_total")
+                    logger.warning("Long-term memory not updated for %s/%s: %s", username, chat or "(catch-up)", e)
+
+    def _catch_up(self, username):
+        index = self.index(username)
+        store = get_store()
+        for session in store.list_sessions(username):
+            if index.progress.get(session["chat"], 0) < session["message_count"] - 1:
+                self._add_turns(username, session["chat"], store.load_chat(username, session["chat"]))
+
+    def _add_turns(self, username, chat, history):
+        from vector_index import embed_texts
+        index = self.index(username)
+        turns = turn_texts(history, index.progress.get(chat, 0))
+        if turns:
+            with get_metrics().timer("memory_embed_seconds"):
+                vectors = embed_texts([text for _, text in turns], self.model)
+            index.append(chat, turns, vectors)
+
+_memory = None
+_memory_lock = threading.Lock()
+
+def get_memory():
+    """Get the process-wide long-term memory, or None if LONG_TERM_MEMORY is off"""
+    global _memory
+    if not LONG_TERM_MEMORY:
+        return None
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                _memory = LongTermMemory()
+    return _memory
\ No newline at end of file
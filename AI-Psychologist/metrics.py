@@ -0,0 +1,215 @@
+"""
+Metrics module for AI Psychologist app
+Records latency and throughput along the request path and exports them
+"""
+
+import streamlit as st
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_WINDOW, METRICS_HOST, METRICS_PORT, ADMIN_USERS
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "ai_psychologist_"
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Histograms shown in the admin panel, with their units
+PANEL_METRICS = {
+    "queue_wait_seconds": "s",
+    "time_to_first_token_seconds": "s",
+    "generation_seconds": "s",
+    "tokens_per_second": "tok/s",
+    "prompt_tokens": "tok",
+    "storage_write_seconds": "s",
+    "render_seconds": "s",
+}
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+def format_labels(labels):
+    """Render labels as {key="value",...} with Prometheus escaping"""
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+class Histogram:
+    """Latest samples of one series plus all-time count and sum"""
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        return {"count": self.count, "sum": self.sum,
+                **{f"p{round(q * 100)}": percentile(ordered, q) for q in QUANTILES}}
+
+class Metrics:
+    """Process-wide histograms and counters
+
+    A series is a metric name plus labels such as the model. Histograms
+    keep the latest ``window`` samples, so percentiles follow current
+    behaviour and memory stays fixed, while their count and sum cover
+    every sample, as Prometheus summaries expect.
+    """
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name, value, **labels):
+        """Add a sample to a histogram"""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.window)
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        """Add to a counter"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the seconds spent in a ``with`` block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """All series as plain data, for JSON export and display"""
+        with self._lock:
+            histograms = [{"name": name, "labels": dict(labels), **h.summary()}
+                          for (name, labels), h in sorted(self._histograms.items())]
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+        return {"histograms": histograms, "counters": counters}
+
+    def prometheus_text(self):
+        """All series in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+        for series in snapshot["histograms"]:
+            name = METRIC_PREFIX + series["name"]
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} summary")
+            for q in QUANTILES:
+                value = series[f"p{round(q * 100)}"]
+                labels = format_labels(dict(series["labels"], quantile=q))
+                lines.append(f"{name}{labels} {'NaN' if value is None else value}")
+            labels = format_labels(series["labels"])
+            lines.append(f"{name}_sum{labels} {series['sum']}")
+            lines.append(f"{name}_count{labels} {series['count']}")
+        for series in snapshot["counters"]:
+            name = METRIC_PREFIX + series["name"]
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{format_labels(series['labels'])} {series['value']}")
+        return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves /metrics (Prometheus text) and /metrics.json"""
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = get_metrics().prometheus_text().encode()
+            content_type = "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body = json.dumps(get_metrics().snapshot()).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Serve the metrics over HTTP from a background thread; returns None if disabled or the port is taken"""
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logger.warning("Metrics endpoint not started on %s:%s: %s", host, port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def get_metrics():
+    """Get the process-wide metrics, starting the export endpoint on first use"""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = Metrics()
+                start_metrics_server()
+    return _metrics
+
+def render_metrics_panel(username):
+    """Render request metrics in the sidebar for admin users"""
+    if username not in ADMIN_USERS:
+        return
+    with st.sidebar.expander("📊 Metrics"):
+        snapshot = get_metrics().snapshot()
+        rows = []
+        for series in snapshot["histograms"]:
+            unit = PANEL_METRICS.get(series["name"])
+            if unit is None:
+                continue
+            rows.append({
+                "metric": f"{series['name']} ({unit})",
+                "model": series["labels"].get("model", "-"),
+                "count": series["count"],
+                **{p: None if series[p] is None else round(series[p], 3) for p in ("p50", "p95", "p99")},
+            })
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        else:
+            st.caption("No requests recorded yet")
+        for series in snapshot["counters"]:
+            labels = ", ".join(f"{k}={v}" for k, v in series["labels"].items())
+            st.caption(f"{series['name']}{f' ({labels})' if labels else ''}: {series['value']}")
+        if METRICS_PORT:
+            st.caption(f"Export: http://{METRICS_HOST}:{METRICS_PORT}/metrics (or /metrics.json)")
\ No newline at end of file
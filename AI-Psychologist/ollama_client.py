@@ -0,0 +1,87 @@
+"""
+Ollama client module for AI Psychologist app
+Shared, pooled HTTP client used for every call to the Ollama API
+"""
+
+import random
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    OLLAMA_HOST, OLLAMA_KEEP_ALIVE, HTTP_POOL_SIZE, AI_CONNECT_TIMEOUT,
+    AI_REQUEST_TIMEOUT, ENDPOINT_READ_TIMEOUTS, MAX_RETRIES,
+    RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX
+)
+from metrics import get_metrics
+
+# Endpoints that load a model and therefore accept the keep_alive option
+MODEL_ENDPOINTS = ("/api/generate", "/api/chat", "/api/embed", "/api/embeddings")
+
+# Statuses worth retrying, everything else is returned to the caller as is
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class OllamaClient:
+    """Keep-alive HTTP client for one Ollama host
+
+    A single ``requests.Session`` with a connection pool is shared by all
+    Streamlit sessions in the process, so turns reuse open TCP connections
+    instead of connecting again each time. Requests are retried on
+    connection errors, timeouts and overload statuses with exponential
+    backoff and full jitter.
+    """
+
+    def __init__(self, host=OLLAMA_HOST, pool_size=HTTP_POOL_SIZE, max_retries=MAX_RETRIES,
+                 connect_timeout=AI_CONNECT_TIMEOUT, read_timeout=AI_REQUEST_TIMEOUT,
+                 keep_alive=OLLAMA_KEEP_ALIVE):
+        self.host = host.rstrip("/")
+        self.max_retries = max_retries
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keep_alive = keep_alive
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def url(self, path):
+        """Get the full URL of an API path"""
+        return f"{self.host}{path}"
+
+    def timeout(self, path, read_timeout=None):
+        """Get the (connect, read) timeout for an endpoint"""
+        if read_timeout is None:
+            read_timeout = ENDPOINT_READ_TIMEOUTS.get(path, self.read_timeout)
+        return self.connect_timeout, read_timeout
+
+    def backoff(self, attempt):
+        """Seconds to wait before retry number ``attempt + 1``"""
+        return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** attempt))
+
+    def request(self, method, path, payload=None, stream=False, retries=None, read_timeout=None):
+        """Send a request with retries; raises the last error if all attempts fail"""
+        retries = max(self.max_retries if retries is None else retries, 1)
+        if payload is not None and path in MODEL_ENDPOINTS:
+            payload = {"keep_alive": self.keep_alive, **payload}
+
+        for attempt in range(retries):
+            last_attempt = attempt == retries - 1
+            try:
+                response = self.session.request(method, self.url(path), json=payload,
+                                                stream=stream, timeout=self.timeout(path, read_timeout))
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    return response
+                response.close()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if last_attempt:
+                    raise
+            get_metrics().increment("retries_total", endpoint=path)
+            time.sleep(self.backoff(attempt))
+
+    def post(self, path, payload, stream=False, retries=None, read_timeout=None):
+        """POST a JSON payload to an API path"""
+        return self.request("POST", path, payload, stream=stream, retries=retries, read_timeout=read_timeout)
+
+    def get(self, path, retries=None):
+        """GET an API path"""
+        return self.request("GET", path, retries=retries)
\ No newline at end of file
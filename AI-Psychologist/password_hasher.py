@@ -0,0 +1,104 @@
+"""
+Password hasher module for AI Psychologist app
+Runs bcrypt hashing and verification on a bounded worker pool
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS
+
+def hash_cost(hashed):
+    """Cost factor of a bcrypt hash, or None if it is not one"""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    """bcrypt on a bounded thread pool
+
+    bcrypt releases the GIL while it works, so the pool's threads hash on
+    separate cores. Capping the pool at ``workers`` means a burst of logins
+    or signups queues up for those threads instead of taking every core
+    away from chats that are already running.
+    """
+
+    def __init__(self, rounds=BCRYPT_ROUNDS, workers=PASSWORD_HASH_WORKERS):
+        self.rounds = rounds
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    def hash(self, password):
+        """Hash a password with the configured cost"""
+        return self._executor.submit(self._hash, password).result()
+
+    def verify(self, password, hashed):
+        """Check a password against a stored hash"""
+        return self._executor.submit(bcrypt.checkpw, password.encode(), hashed.encode()).result()
+
+    def needs_rehash(self, hashed):
+        """Whether a hash was made with a different cost than configured"""
+        return hash_cost(hashed) != self.rounds
+
+    def rehash_later(self, password, on_done):
+        """Hash a password in the background and pass the result to ``on_done``"""
+        def finished(future):
+            if future.exception() is None:
+                on_done(future.result())
+
+        self._executor.submit(self._hash, password).add_done_callback(finished)
+
+    def _hash(self, password):
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(self.rounds)).decode()
+
+_hasher = None
+_hasher_lock = threading.Lock()
+
+def get_hasher():
+    """Get the process-wide password hasher"""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher()
+    return _hasher
+
+def benchmark(rounds, workers, logins):
+    """Time single hashes and a burst of concurrent logins"""
+    hasher = PasswordHasher(rounds=rounds, workers=workers)
+    hashed = hasher.hash("benchmark-password")
+
+    start = time.perf_counter()
+    hasher.hash("benchmark-password")
+    hash_latency = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hasher.verify("benchmark-password", hashed)
+    verify_latency = time.perf_counter() - start
+
+    # One thread per login, as with concurrent Streamlit sessions
+    threads = [threading.Thread(target=hasher.verify, args=("benchmark-password", hashed))
+               for _ in range(logins)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    cores = min(workers, os.cpu_count() or 1)
+    print(f"bcrypt cost {rounds}, {workers} worker(s), {os.cpu_count()} CPU(s)")
+    print(f"  hash latency:      {hash_latency * 1000:.1f} ms")
+    print(f"  verify latency:    {verify_latency * 1000:.1f} ms")
+    print(f"  {logins} logins took:  {elapsed:.2f} s")
+    print(f"  logins/s:          {logins / elapsed:.2f}")
+    print(f"  logins/s per core: {logins / elapsed / cores:.2f}")
+
+if __name__ == "__main__":
+    # python password_hasher.py [rounds ...]
+    for rounds in [int(r) for r in sys.argv[1:]] or [BCRYPT_ROUNDS]:
+        benchmark(rounds, PASSWORD_HASH_WORKERS, logins=20)
\ No newline at end of file
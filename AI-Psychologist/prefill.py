@@ -0,0 +1,135 @@
+"""
+Prefill module for AI Psychologist app
+Speculatively evaluates a chat's prompt so the next turn starts sooner
+"""
+
+import http.client
+import json
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+from config import PREFILL_MIN_INTERVAL, PREFILL_MAX_IN_FLIGHT, MODEL_LOAD_TIMEOUT
+from backend_pool import get_pool
+from request_queue import get_scheduler
+from metrics import get_metrics
+
+class PrefillJob:
+    """One prefill request that can be cancelled from another thread
+
+    Ollama only sends response headers once the prompt is evaluated, so
+    the job uses its own connection that ``cancel`` can shut down while the
+    request is still waiting; Ollama then drops the work.
+    """
+
+    def __init__(self, username, model, payload):
+        self.username = username
+        self.model = model
+        self.payload = payload
+        self.cancelled = threading.Event()
+        self.connection = None
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """Stop the request, even while it waits for Ollama"""
+        self.cancelled.set()
+        with self._lock:
+            sock = self.connection.sock if self.connection is not None else None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def run(self):
+        """Send the request and wait for it unless cancelled; returns the outcome"""
+        backend = get_pool().choose(self.model)
+        url = urlsplit(backend.host)
+        connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        connection = connection_class(url.hostname, url.port, timeout=MODEL_LOAD_TIMEOUT)
+        payload = json.dumps({"keep_alive": backend.client.keep_alive, **self.payload})
+        try:
+            connection.connect()
+            with self._lock:
+                self.connection = connection
+            if self.cancelled.is_set():
+                return "cancelled"
+            connection.request("POST", "/api/generate", payload, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            if self.cancelled.is_set():
+                return "cancelled"
+            return "done" if response.status == 200 else "error"
+        except (OSError, http.client.HTTPException):
+            return "cancelled" if self.cancelled.is_set() else "error"
+        finally:
+            connection.close()
+
+class Prefetcher:
+    """Runs prefill requests only when they cannot hold up real ones
+
+    A prefill starts only while the scheduler has nothing queued or
+    running, at most ``max_in_flight`` at once and once per
+    ``min_interval`` seconds per user. Every running prefill is cancelled
+    as soon as a real request is queued.
+    """
+
+    def __init__(self, min_interval=PREFILL_MIN_INTERVAL, max_in_flight=PREFILL_MAX_IN_FLIGHT):
+        self.min_interval = min_interval
+        self.max_in_flight = max_in_flight
+        self._running = {}  # username -> PrefillJob
+        self._last_started = {}  # username -> monotonic time
+        self._lock = threading.Lock()
+        get_scheduler().add_submit_listener(lambda ticket: self.cancel_all())
+
+    def request(self, username, model, payload):
+        """Start a prefill if the limits allow it; returns True if it started"""
+        if not get_scheduler().is_idle():
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if username in self._running or len(self._running) >= self.max_in_flight:
+                return False
+            if now - self._last_started.get(username, float("-inf")) < self.min_interval:
+                return False
+            job = self._running[username] = PrefillJob(username, model, payload)
+            self._last_started[username] = now
+        threading.Thread(target=self._run, args=(job,), name="prefill", daemon=True).start()
+        return True
+
+    def cancel(self, username):
+        """Cancel a user's running prefill"""
+        with self._lock:
+            job = self._running.get(username)
+        if job is not None:
+            job.cancel()
+
+    def cancel_all(self):
+        """Cancel every running prefill"""
+        with self._lock:
+            jobs = list(self._running.values())
+        for job in jobs:
+            job.cancel()
+
+    def _run(self, job):
+        started = time.perf_counter()
+        try:
+            outcome = job.run()
+        finally:
+            with self._lock:
+                self._running.pop(job.username, None)
+        get_metrics().increment("prefills_total", model=job.model, outcome=outcome)
+        if outcome == "done":
+            get_metrics().observe("prefill_seconds", time.perf_counter() - started, model=job.model)
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+def get_prefetcher():
+    """Get the process-wide prefetcher"""
+    global _prefetcher
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = Prefetcher()
+    return _prefetcher
\ No newline at end of file
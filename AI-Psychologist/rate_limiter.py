@@ -0,0 +1,192 @@
+"""
+Rate limiter module for AI Psychologist app
+Token-bucket quotas on model requests and generated tokens per user
+"""
+
+import sqlite3
+import threading
+import time
+from config import (
+    RATE_LIMIT_REQUESTS_PER_MINUTE, RATE_LIMIT_TOKENS_PER_HOUR, RATE_LIMIT_GLOBAL_REQUESTS_PER_MINUTE,
+    RATE_LIMIT_BACKEND, RATE_LIMIT_DB_FILE
+)
+from metrics import get_metrics
+
+class RateLimitError(Exception):
+    """Raised when a request is over a quota; ``retry_after`` is in seconds"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def apply_draws(buckets, draws, now):
+    """Apply draws to bucket states in place, all or nothing
+
+    ``buckets`` maps a key to ``[tokens, updated_at]`` and each draw is
+    ``(key, capacity, per_second, amount, need)``: the bucket is refilled,
+    then ``amount`` is taken if it holds at least ``need`` (``None`` takes
+    it regardless, possibly into debt). A negative ``amount`` gives tokens
+    back, up to ``capacity``. Returns ``(0, None)`` when every draw
+    was applied, else the seconds to wait and the index of the draw that
+    waits longest; nothing is taken then.
+    """
+    wait, blocked = 0.0, None
+    for index, (key, capacity, per_second, amount, need) in enumerate(draws):
+        tokens, updated_at = buckets.setdefault(key, [capacity, now])
+        tokens = min(capacity, tokens + max(now - updated_at, 0) * per_second)
+        buckets[key][:] = [tokens, now]
+        if need is not None and tokens < need and (need - tokens) / per_second > wait:
+            wait, blocked = (need - tokens) / per_second, index
+    if blocked is None:
+        for key, capacity, _, amount, _ in draws:
+            buckets[key][0] = min(capacity, buckets[key][0] - amount)
+    return wait, blocked
+
+class MemoryBucketStore:
+    """Bucket states held in this process"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def draw(self, draws, now):
+        with self._lock:
+            return apply_draws(self._buckets, draws, now)
+
+class SQLiteBucketStore:
+    """Bucket states in a SQLite database shared by several processes
+
+    Each draw reads and writes the buckets it touches inside one
+    ``BEGIN IMMEDIATE`` transaction, so concurrent processes never take
+    from a stale state.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS buckets (
+        key TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    """
+
+    def __init__(self, db_path=RATE_LIMIT_DB_FILE):
+        self.db_path = db_path
+        self._local = threading.local()
+        self.connection().executescript(self.SCHEMA)
+
+    def connection(self):
+        """Get this thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def draw(self, draws, now):
+        conn = self.connection()
+        keys = list(dict.fromkeys(d[0] for d in draws))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(f"SELECT key, tokens, updated_at FROM buckets WHERE key IN "
+                                f"({','.join('?' * len(keys))})", keys)
+            buckets = {key: [tokens, updated_at] for key, tokens, updated_at in rows}
+            result = apply_draws(buckets, draws, now)
+            conn.executemany("INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                             [(key, *buckets[key]) for key in keys])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+def format_wait(seconds):
+    """Human readable wait, rounded up"""
+    seconds = max(int(-(-seconds // 1)), 1)
+    if seconds < 60:
+        return f"{seconds} second{'s' if seconds != 1 else ''}"
+    minutes = -(-seconds // 60)
+    return f"{minutes} minute{'s' if minutes != 1 else ''}"
+
+class RateLimiter:
+    """Token-bucket quotas on model usage
+
+    Every user has a bucket of ``requests_per_minute`` requests and one of
+    ``tokens_per_hour`` generated tokens, both refilled continuously, and a
+    global bucket caps the requests of all users together. Reply tokens are
+    only known afterwards, so they are charged once a reply is done and may
+    put the bucket into debt; new requests wait until it is refilled. A
+    quota of 0 turns that limit off.
+    """
+
+    MESSAGES = {
+        "requests": "You're sending messages too quickly.",
+        "tokens": "You've reached your hourly limit for AI replies.",
+        "global": "The AI service is handling too many requests right now.",
+    }
+
+    def __init__(self, store=None, requests_per_minute=RATE_LIMIT_REQUESTS_PER_MINUTE,
+                 tokens_per_hour=RATE_LIMIT_TOKENS_PER_HOUR,
+                 global_requests_per_minute=RATE_LIMIT_GLOBAL_REQUESTS_PER_MINUTE):
+        self.store = store or MemoryBucketStore()
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_hour = tokens_per_hour
+        self.global_requests_per_minute = global_requests_per_minute
+
+    def acquire(self, username):
+        """Take one request from the user's and the global quota, or raise RateLimitError"""
+        draws, limits = [], []
+        if self.requests_per_minute:
+            draws.append((f"requests:{username}", self.requests_per_minute, self.requests_per_minute / 60, 1, 1))
+            limits.append("requests")
+        if self.tokens_per_hour:
+            draws.append((f"tokens:{username}", self.tokens_per_hour, self.tokens_per_hour / 3600, 0, 1))
+            limits.append("tokens")
+        if self.global_requests_per_minute:
+            rate = self.global_requests_per_minute
+            draws.append(("requests:*", rate, rate / 60, 1, 1))
+            limits.append("global")
+        if not draws:
+            return
+        wait, blocked = self.store.draw(draws, time.time())
+        if blocked is not None:
+            limit = limits[blocked]
+            get_metrics().increment("rate_limited_total", limit=limit)
+            raise RateLimitError(f"{self.MESSAGES[limit]} Please try again in {format_wait(wait)}.", wait)
+
+    def refund(self, username):
+        """Give back the request taken by ``acquire`` when it was turned away before using the model"""
+        draws = []
+        if self.requests_per_minute:
+            draws.append((f"requests:{username}", self.requests_per_minute, self.requests_per_minute / 60, -1, None))
+        if self.global_requests_per_minute:
+            rate = self.global_requests_per_minute
+            draws.append(("requests:*", rate, rate / 60, -1, None))
+        if draws:
+            self.store.draw(draws, time.time())
+
+    def charge_tokens(self, username, tokens):
+        """Charge the tokens of a finished reply to the user's quota"""
+        if self.tokens_per_hour and tokens > 0:
+            self.store.draw([(f"tokens:{username}", self.tokens_per_hour, self.tokens_per_hour / 3600,
+                              tokens, None)], time.time())
+
+def create_rate_limiter(backend=RATE_LIMIT_BACKEND):
+    """Create the rate limiter configured by RATE_LIMIT_BACKEND"""
+    if backend == "sqlite":
+        return RateLimiter(SQLiteBucketStore())
+    if backend == "memory":
+        return RateLimiter(MemoryBucketStore())
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """Get the process-wide rate limiter"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = create_rate_limiter()
+    return _rate_limiter
\ No newline at end of file
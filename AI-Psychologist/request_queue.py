@@ -0,0 +1,249 @@
+"""
+Request queue module for AI Psychologist app
+Schedules model requests fairly across users and limits load on the backend
+"""
+
+import streamlit as st
+import asyncio
+import threading
+import time
+from collections import deque
+from config import (
+    MAX_QUEUED_REQUESTS, MAX_QUEUED_PER_USER, MAX_IN_FLIGHT_PER_USER,
+    MAX_IN_FLIGHT_PER_MODEL, DEFAULT_MAX_IN_FLIGHT, QUEUE_WAIT_TIMEOUT
+)
+from metrics import get_metrics
+
+class QueueFullError(Exception):
+    """Raised when a request is rejected because the queue is full"""
+
+class Ticket:
+    """A user's place in the queue for one model request
+
+    The request itself runs on the caller's thread once the ticket is
+    granted, so replies can still be streamed into the page. Using the
+    ticket as a context manager gives the slot back (or leaves the queue)
+    however the request ends.
+    """
+
+    def __init__(self, scheduler, username, model):
+        self.scheduler = scheduler
+        self.username = username
+        self.model = model
+        self.enqueued_at = time.monotonic()
+        self.granted_at = None
+        self._granted = threading.Event()
+        self._released = False
+
+    @property
+    def granted(self):
+        return self._granted.is_set()
+
+    @property
+    def queue_wait(self):
+        """Seconds spent waiting for a slot"""
+        end = self.granted_at if self.granted_at is not None else time.monotonic()
+        return end - self.enqueued_at
+
+    def position(self):
+        """Position in the queue, 0 once the request is running"""
+        return self.scheduler.position(self)
+
+    def wait(self, timeout=None):
+        """Block until the request may run; returns False on timeout"""
+        return self._granted.wait(timeout)
+
+    def release(self):
+        """Give the slot back, or leave the queue if it was never granted"""
+        self.scheduler.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class InferenceScheduler:
+    """Bounded, fair queue in front of the model backend
+
+    Waiting requests are kept per user, and users are served in order of
+    when they were last served, so one busy account cannot push everyone
+    else to the back. A request only starts
+    when both its user and its model have a free in-flight slot. Requests
+    beyond the queue bounds are rejected at once instead of piling up and
+    timing out. Grants are made by a dispatcher coroutine on a private
+    asyncio loop, woken whenever a request is queued or finishes.
+    """
+
+    def __init__(self, max_queued=MAX_QUEUED_REQUESTS, max_queued_per_user=MAX_QUEUED_PER_USER,
+                 max_in_flight_per_user=MAX_IN_FLIGHT_PER_USER,
+                 max_in_flight_per_model=None, default_max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self.max_in_flight_per_user = max_in_flight_per_user
+        self.max_in_flight_per_model = (MAX_IN_FLIGHT_PER_MODEL if max_in_flight_per_model is None
+                                        else max_in_flight_per_model)
+        self.default_max_in_flight = default_max_in_flight
+
+        self._lock = threading.Lock()
+        self._waiting = {}  # username -> deque of waiting tickets
+        self._last_served = {}  # username -> monotonic time of the last grant
+        self._queued = 0
+        self._user_in_flight = {}
+        self._model_in_flight = {}
+        self._submit_listeners = []
+
+        self._loop = asyncio.new_event_loop()
+        self._wakeup = None
+        threading.Thread(target=self._run_loop, name="inference-scheduler", daemon=True).start()
+
+    def submit(self, username, model):
+        """Queue a request; raises QueueFullError when it cannot be accepted"""
+        ticket = Ticket(self, username, model)
+        with self._lock:
+            user_queue = self._waiting.get(username)
+            if self._queued >= self.max_queued:
+                get_metrics().increment("queue_rejections_total", model=model)
+                raise QueueFullError("The AI service is busy right now. Please try again in a moment.")
+            if user_queue is not None and len(user_queue) >= self.max_queued_per_user:
+                get_metrics().increment("queue_rejections_total", model=model)
+                raise QueueFullError("You already have a message waiting for a reply.")
+            self._waiting.setdefault(username, deque()).append(ticket)
+            self._queued += 1
+            listeners = list(self._submit_listeners)
+        for listener in listeners:
+            listener(ticket)
+        self._notify()
+        return ticket
+
+    def add_submit_listener(self, listener):
+        """Call ``listener(ticket)`` whenever a request is queued"""
+        with self._lock:
+            self._submit_listeners.append(listener)
+
+    def is_idle(self):
+        """True when no request is waiting or running"""
+        with self._lock:
+            return not self._queued and not any(self._model_in_flight.values())
+
+    def release(self, ticket):
+        """Finish a running request or withdraw a waiting one"""
+        with self._lock:
+            if ticket._released:
+                return
+            ticket._released = True
+            if ticket.granted:
+                self._user_in_flight[ticket.username] -= 1
+                self._model_in_flight[ticket.model] -= 1
+            else:
+                user_queue = self._waiting.get(ticket.username)
+                if user_queue is not None and ticket in user_queue:
+                    user_queue.remove(ticket)
+                    self._queued -= 1
+                    if not user_queue:
+                        del self._waiting[ticket.username]
+        self._notify()
+
+    def position(self, ticket):
+        """1-based position of a waiting ticket in serving order"""
+        with self._lock:
+            if ticket.granted or ticket._released:
+                return 0
+            queues = [list(self._waiting[u]) for u in self._serving_order()]
+            position = 0
+            for depth in range(max((len(q) for q in queues), default=0)):
+                for queue in queues:
+                    if depth < len(queue):
+                        position += 1
+                        if queue[depth] is ticket:
+                            return position
+            return 0
+
+    def stats(self):
+        """Snapshot of queue depth and in-flight requests"""
+        with self._lock:
+            return {
+                "queued": self._queued,
+                "in_flight_per_model": {m: n for m, n in self._model_in_flight.items() if n},
+            }
+
+    def _model_limit(self, model):
+        return self.max_in_flight_per_model.get(model, self.default_max_in_flight)
+
+    def _serving_order(self):
+        """Users with waiting requests, least recently served first"""
+        return sorted(self._waiting, key=lambda u: self._last_served.get(u, 0.0))
+
+    def _grant_ready(self):
+        """Grant every waiting request that has a free slot, fairly across users"""
+        with self._lock:
+            granted_any = True
+            while granted_any:
+                granted_any = False
+                for username in self._serving_order():
+                    user_queue = self._waiting[username]
+                    ticket = user_queue[0]
+                    if self._user_in_flight.get(username, 0) >= self.max_in_flight_per_user:
+                        continue
+                    if self._model_in_flight.get(ticket.model, 0) >= self._model_limit(ticket.model):
+                        continue
+                    user_queue.popleft()
+                    self._queued -= 1
+                    if not user_queue:
+                        del self._waiting[username]
+                    # Served users go to the back of the line
+                    self._last_served[username] = time.monotonic()
+                    self._user_in_flight[username] = self._user_in_flight.get(username, 0) + 1
+                    self._model_in_flight[ticket.model] = self._model_in_flight.get(ticket.model, 0) + 1
+                    ticket.granted_at = time.monotonic()
+                    ticket._granted.set()
+                    get_metrics().observe("queue_wait_seconds", ticket.queue_wait, model=ticket.model)
+                    granted_any = True
+                    break
+
+    def _notify(self):
+        self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        self._wakeup.set()
+
+    async def _dispatch(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            self._grant_ready()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        # Created here so the event belongs to the scheduler's loop
+        self._wakeup = asyncio.Event()
+        self._loop.run_until_complete(self._dispatch())
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Get the process-wide inference scheduler"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = InferenceScheduler()
+    return _scheduler
+
+def wait_for_turn(ticket, timeout=QUEUE_WAIT_TIMEOUT):
+    """Wait for a ticket to be granted, showing the queue position meanwhile"""
+    if ticket.wait(0.05):
+        return True
+    status = st.empty()
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline:
+            position = ticket.position()
+            if position:
+                status.info(f"⏳ Waiting for the AI... you are #{position} in line")
+            if ticket.wait(0.5):
+                return True
+        return False
+    finally:
+        status.empty()
\ No newline at end of file
@@ -0,0 +1,207 @@
+"""
+Response cache module for AI Psychologist app
+Serves repeated prompts without running the model again
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from config import (
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_TEMPERATURE, RESPONSE_CACHE_MAX_TURNS,
+    RESPONSE_CACHE_DIR, RESPONSE_CACHE_MAX_DISK_ENTRIES
+)
+
+def normalize_text(text):
+    """Normalize a message so trivially different phrasings share a cache entry"""
+    text = re.sub(r"[^\w\s]", "", text.lower())
+    return " ".join(text.split())
+
+def is_cacheable(conversation_history, temperature):
+    """Decide whether a reply may be served from or stored in the cache
+
+    Greedy decoding always gives the same reply, so any short conversation
+    can be cached. With sampling, replies differ from run to run; only
+    conversation openers are cached then, and only at moderate
+    temperatures, so a cached reply is as good as a fresh one.
+    """
+    if temperature > RESPONSE_CACHE_MAX_TEMPERATURE:
+        return False
+    limit = RESPONSE_CACHE_MAX_TURNS if temperature > 0 else RESPONSE_CACHE_MAX_TURNS * 3
+    return 0 < len(conversation_history) <= limit
+
+class ResponseCache:
+    """LRU + TTL cache of model replies keyed on model, options and prompt
+
+    Keys hash the model, its sampling options and the normalized
+    conversation. Entries live in memory, bounded by count and total size,
+    and optionally in a directory so they survive restarts; the files are
+    counted once at start and pruned, oldest first, only when a write takes
+    the count over its limit. Counters report hits, misses, evictions and
+    the generation time saved.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, max_bytes=RESPONSE_CACHE_MAX_BYTES,
+                 ttl=RESPONSE_CACHE_TTL, directory=RESPONSE_CACHE_DIR,
+                 max_disk_entries=RESPONSE_CACHE_MAX_DISK_ENTRIES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._disk_entries = 0
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0,
+                         "stores": 0, "saved_seconds": 0.0}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_entries = len(self._disk_files())
+
+    @staticmethod
+    def key(model, options, conversation_history):
+        """Hash of everything that determines the reply"""
+        payload = json.dumps({
+            "model": model,
+            "options": options,
+            "conversation": [(m["role"], normalize_text(m["text"])) for m in conversation_history],
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        """Return the cached reply text, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry["created"] > self.ttl:
+                self._drop(key)
+                self.counters["evictions"] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                self.counters["saved_seconds"] += entry["seconds"]
+                return entry["text"]
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters["disk_hits"] += 1
+            self.counters["saved_seconds"] += entry["seconds"]
+            self._store(key, entry)
+            return entry["text"]
+
+    def put(self, key, text, seconds=0.0):
+        """Cache a reply along with the generation time it took"""
+        entry = {"text": text, "seconds": seconds, "created": time.time()}
+        with self._lock:
+            self._store(key, entry)
+            self.counters["stores"] += 1
+        self._write_disk(key, entry)
+
+    def stats(self):
+        """Counters plus current memory usage"""
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries), bytes=self._bytes)
+
+    def _store(self, key, entry):
+        self._drop(key)
+        size = len(entry["text"].encode())
+        if size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.counters["evictions"] += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry["text"].encode())
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _disk_files(self):
+        return [f for f in os.listdir(self.directory) if f.endswith(".json")]
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["created"] > self.ttl:
+            try:
+                os.remove(self._disk_path(key))
+                with self._lock:
+                    self._disk_entries -= 1
+            except OSError:
+                pass
+            return None
+        return entry
+
+    def _write_disk(self, key, entry):
+        if not self.directory:
+            return
+        try:
+            path = self._disk_path(key)
+            new = not os.path.exists(path)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_entries += new
+            over = self._disk_entries > self.max_disk_entries
+        if over:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Remove the oldest files, down to 90% of the limit so the next writes don't prune again"""
+        if not self._prune_lock.acquire(blocking=False):
+            return  # Another write is already pruning
+        try:
+            files = self._disk_files()
+            keep = self.max_disk_entries * 9 // 10
+            paths = sorted((os.path.join(self.directory, f) for f in files), key=os.path.getmtime)
+            removed = 0
+            for path in paths[:max(len(paths) - keep, 0)]:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+            with self._lock:
+                # Recount, as other processes may share the directory
+                self._disk_entries = len(files) - removed
+                self.counters["evictions"] += removed
+        except OSError:
+            pass
+        finally:
+            self._prune_lock.release()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Get the process-wide response cache, or None when caching is disabled"""
+    global _cache
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
\ No newline at end of file
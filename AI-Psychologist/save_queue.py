@@ -0,0 +1,135 @@
+"""
+Save queue module for AI Psychologist app
+Writes chat sessions from a background thread, off the request path
+"""
+
+import atexit
+import threading
+import time
+from chat_store import get_store, session_entry
+from search_index import get_search_index
+from memory_index import get_memory
+from metrics import get_metrics
+from config import SAVE_FLUSH_INTERVAL, CHAT_STORAGE_BACKEND
+
+class SaveQueue:
+    """Write-behind queue for chat sessions
+
+    ``save`` only keeps a snapshot of the session; a background thread
+    writes everything pending every ``interval`` seconds. Saving a session
+    again before it is written replaces the snapshot, so a burst of turns
+    costs one write. ``flush`` writes sessions straight away and ``close``
+    (run at exit) writes the rest, so only a crash can lose turns, and at
+    most the last ``interval`` seconds of them. With an interval of 0 every
+    save is written before ``save`` returns.
+    """
+
+    def __init__(self, store=None, interval=SAVE_FLUSH_INTERVAL):
+        self.store = store or get_store()
+        self.interval = interval
+        self._pending = {}  # (username, chat) -> (history, saved at)
+        self._writing = {}  # the same, for sessions being written
+        self._errors = {}  # (username, chat) -> why its last write failed
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if interval > 0:
+            self._thread = threading.Thread(target=self._run, name="save-queue", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def save(self, username, chat, history):
+        """Queue a snapshot of a session to be written"""
+        key = (username, chat)
+        snapshot = ([dict(m) for m in history], time.time())
+        if self._thread is None:
+            with self._write_lock:
+                self._write(key, snapshot[0])
+            return
+        with self._lock:
+            if key in self._pending:
+                get_metrics().increment("saves_coalesced_total")
+            self._pending[key] = snapshot
+
+    def flush(self, username=None, chat=None):
+        """Write the pending sessions of one chat, one user or everyone now; raises the first error"""
+        errors = self._flush(username, chat)
+        if errors:
+            raise errors[0]
+
+    def discard(self, username, chat):
+        """Drop a session's pending snapshot, e.g. before it is deleted; returns True if there was one"""
+        with self._write_lock:
+            with self._lock:
+                self._errors.pop((username, chat), None)
+                return self._pending.pop((username, chat), None) is not None
+
+    def error(self, username, chat):
+        """The error of a session's last write if it failed, else None"""
+        with self._lock:
+            return self._errors.get((username, chat))
+
+    def pending_sessions(self, username):
+        """Index entries of a user's sessions that are not written yet"""
+        with self._lock:
+            snapshots = {**self._writing, **self._pending}
+        return [session_entry(chat, history, saved_at)
+                for (user, chat), (history, saved_at) in snapshots.items() if user == username]
+
+    def close(self):
+        """Stop the background thread and write everything still pending"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._flush()
+
+    def _flush(self, username=None, chat=None):
+        errors = []
+        with self._write_lock:
+            with self._lock:
+                keys = [k for k in self._pending
+                        if (username is None or k[0] == username) and (chat is None or k[1] == chat)]
+                for key in keys:
+                    self._writing[key] = self._pending.pop(key)
+            for key in keys:
+                history, saved_at = self._writing[key]
+                try:
+                    self._write(key, history)
+                    with self._lock:
+                        self._errors.pop(key, None)
+                except Exception as e:
+                    errors.append(e)
+                    get_metrics().increment("save_errors_total")
+                    with self._lock:
+                        self._errors[key] = e
+                        # Retried on the next flush unless a newer snapshot came in
+                        self._pending.setdefault(key, (history, saved_at))
+                finally:
+                    with self._lock:
+                        del self._writing[key]
+        return errors
+
+    def _write(self, key, history):
+        with get_metrics().timer("storage_write_seconds", backend=CHAT_STORAGE_BACKEND):
+            self.store.save_chat(*key, history)
+        get_search_index().update(*key, history)
+        memory = get_memory()
+        if memory is not None:
+            memory.remember(*key, history)
+
+_save_queue = None
+_save_queue_lock = threading.Lock()
+
+def get_save_queue():
+    """Get the process-wide save queue"""
+    global _save_queue
+    if _save_queue is None:
+        with _save_queue_lock:
+            if _save_queue is None:
+                _save_queue = SaveQueue()
+    return _save_queue
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""
+Search index module for AI Psychologist app
+Full-text search over users' chat messages with SQLite FTS5
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+from chat_store import get_store, history_digest
+from config import SEARCH_DB_FILE, SEARCH_RESULTS_LIMIT
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"\w+")
+HIT_START, HIT_END = "\x02", "\x03"
+
+def owner_token(username):
+    """Single indexed token naming a message's owner, so a search only reads that user's matches"""
+    return "u" + hashlib.sha1(username.encode()).hexdigest()[:20]
+
+def match_query(query):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix"""
+    words = WORD_PATTERN.findall(query)
+    if not words:
+        return None
+    return " ".join(f'"{w}"' for w in words[:-1]) + f' "{words[-1]}"*'
+
+class SearchIndex:
+    """Inverted index of every user's messages, kept next to the chat store
+
+    The index lives in its own FTS5 database whatever the chat storage
+    backend is, and is updated as sessions are written: only messages past
+    the last indexed one are added, and a session is only indexed again
+    from scratch when earlier messages changed, going by a digest of the
+    indexed messages. Sessions written before the
+    index existed, or by another process, are picked up the first time a
+    user searches.
+    """
+
+    SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5(
+        text, owner, username UNINDEXED, chat UNINDEXED, seq UNINDEXED, role UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    );
+    CREATE TABLE IF NOT EXISTS indexed (
+        username TEXT NOT NULL,
+        chat TEXT NOT NULL,
+        message_count INTEGER NOT NULL,
+        digest TEXT,
+        PRIMARY KEY (username, chat)
+    );
+    """
+
+    def __init__(self, db_path=SEARCH_DB_FILE, store=None):
+        self.db_path = db_path
+        self.store = store or get_store()
+        self._local = threading.local()
+        self._synced = set()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self.connection()
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(indexed)")]
+        if "last_digest" in columns:
+            # Indexes from before the digest covered every message are rebuilt by the next searches
+            with conn:
+                conn.execute("DROP TABLE indexed")
+                conn.execute("DROP TABLE messages")
+        conn.executescript(self.SCHEMA)
+
+    def connection(self):
+        """Get this thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def update(self, username, chat, history):
+        """Index the messages of a session that are not indexed yet"""
+        try:
+            with self._lock, self.connection() as conn:
+                self._update(conn, username, chat, history)
+        except sqlite3.Error as e:
+            logger.warning("Search index not updated for %s/%s: %s", username, chat, e)
+            # Caught up on the user's next search
+            self._synced.discard(username)
+
+    def remove(self, username, chat):
+        """Drop a session from the index"""
+        try:
+            with self._lock, self.connection() as conn:
+                self._remove(conn, username, chat)
+        except sqlite3.Error:
+            # Dropped on the user's next search instead
+            self._synced.discard(username)
+            raise
+
+    def search(self, username, query, limit=SEARCH_RESULTS_LIMIT):
+        """Best matching messages of a user, each with its chat, position and a snippet"""
+        match = match_query(query)
+        if match is None:
+            return []
+        self.sync(username)
+        rows = self.connection().execute(
+            f"SELECT chat, seq, role, snippet(messages, 0, '{HIT_START}', '{HIT_END}', '…', 12) "
+            "FROM messages WHERE messages MATCH ? ORDER BY rank LIMIT ?",
+            (f'owner : "{owner_token(username)}" AND text : ({match})', limit))
+        return [{"chat": chat, "seq": int(seq), "role": role, "snippet": snippet}
+                for chat, seq, role, snippet in rows]
+
+    def sync(self, username):
+        """Index sessions that were saved without going through ``update``, once per process"""
+        if username in self._synced:
+            return
+        with self._lock:
+            conn = self.connection()
+            indexed = dict(conn.execute("SELECT chat, message_count FROM indexed WHERE username = ?",
+                                        (username,)))
+            sessions = {s["chat"]: s["message_count"] for s in self.store.list_sessions(username)}
+            with conn:
+                for chat in indexed.keys() - sessions.keys():
+                    self._remove(conn, username, chat)
+                for chat, count in sessions.items():
+                    if indexed.get(chat) != count:
+                        self._update(conn, username, chat, self.store.load_chat(username, chat))
+            self._synced.add(username)
+
+    def _update(self, conn, username, chat, history):
+        row = conn.execute("SELECT message_count, digest FROM indexed WHERE username = ? AND chat = ?",
+                           (username, chat)).fetchone()
+        start = 0
+        if row is not None:
+            count, digest = row
+            if count <= len(history) and history_digest(history[:count]) == digest:
+                start = count
+            else:
+                self._delete_messages(conn, username, chat)
+        conn.executemany("INSERT INTO messages (text, owner, username, chat, seq, role) "
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+                         [(m["text"], owner_token(username), username, chat, seq, m["role"])
+                          for seq, m in enumerate(history[start:], start=start)])
+        conn.execute("INSERT OR REPLACE INTO indexed VALUES (?, ?, ?, ?)",
+                     (username, chat, len(history), history_digest(history)))
+
+    def _delete_messages(self, conn, username, chat):
+        conn.execute("DELETE FROM messages WHERE rowid IN (SELECT rowid FROM messages WHERE messages MATCH ?) "
+                     "AND chat = ?", (f'owner : "{owner_token(username)}"', chat))
+
+    def _remove(self, conn, username, chat):
+        self._delete_messages(conn, username, chat)
+        conn.execute("DELETE FROM indexed WHERE username = ? AND chat = ?", (username, chat))
+
+_search_index = None
+_search_index_lock = threading.Lock()
+
+def get_search_index():
+    """Get the process-wide search index"""
+    global _search_index
+    if _search_index is None:
+        with _search_index_lock:
+            if _search_index is None:
+                _search_index = SearchIndex()
+    return _search_index
\ No newline at end of file
@@ -31,6 +31,11 @@ def apply_custom_css():
             margin-right: auto; /* Pushes to the left */
         }
 
+        .search-hit {
+            border-left-color: #f0ad4e;
+            box-shadow: 0 0 0 2px #f0ad4e;
+        }
+
         .stButton > button {
             width: 100%;
         }
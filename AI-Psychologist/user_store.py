@@ -0,0 +1,254 @@
+"""
+User store module for AI Psychologist app
+Cached, concurrency-safe storage of user accounts
+"""
+
+import copy
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+import yaml
+from yaml.loader import SafeLoader
+from config import USERS_FILE, USERS_DB_FILE, USER_STORE_BACKEND, DEFAULT_CONFIG
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on ``<path>.lock`` across processes"""
+    with open(path + ".lock", "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+class YamlUserStore:
+    """users.yaml kept parsed in memory
+
+    The file is only parsed again when its mtime or size changes, so a rerun
+    no longer pays for a full YAML load. Writes take a lock file, re-read the
+    latest version and replace the file atomically through a temp file, so
+    concurrent signups cannot overwrite each other.
+    """
+
+    def __init__(self, path=USERS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature = None
+        self._config = None
+
+    def config(self):
+        """The full user configuration; treat it as read-only"""
+        with self._lock:
+            return self._current()
+
+    def users(self):
+        """Username-indexed account records"""
+        return self.config()['credentials']['usernames']
+
+    def get_user(self, username):
+        return self.users().get(username)
+
+    def credentials(self):
+        """Credentials for streamlit_authenticator
+
+        The authenticator writes login flags into the records it is given,
+        so every call, i.e. every session's authenticator, gets its own copies.
+        """
+        with self._lock:
+            usernames = self._current()['credentials']['usernames']
+            return {'usernames': {u: dict(r) for u, r in usernames.items()}}
+
+    def add_user(self, username, record):
+        """Add an account; returns False if the username is taken"""
+        with self._lock, file_lock(self.path):
+            config = copy.deepcopy(self._current(locked=True))
+            if username in config['credentials']['usernames']:
+                return False
+            config['credentials']['usernames'][username] = record
+            self._write(config)
+            return True
+
+    def update_user(self, username, **fields):
+        """Change fields of an existing account"""
+        with self._lock, file_lock(self.path):
+            config = copy.deepcopy(self._current(locked=True))
+            config['credentials']['usernames'][username].update(fields)
+            self._write(config)
+
+    def save_config(self, config):
+        """Replace the whole configuration"""
+        with self._lock, file_lock(self.path):
+            self._write(copy.deepcopy(config))
+
+    def _current(self, locked=False):
+        """The cached config, re-read if the file changed; ``locked`` if the caller holds the file lock"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            # Create default config if file doesn't exist
+            if locked:
+                self._write(copy.deepcopy(DEFAULT_CONFIG))
+            else:
+                with file_lock(self.path):
+                    if not os.path.exists(self.path):
+                        self._write(copy.deepcopy(DEFAULT_CONFIG))
+            stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature:
+            with open(self.path, 'r') as file:
+                config = yaml.load(file, Loader=SafeLoader)
+            config.setdefault('credentials', {}).setdefault('usernames', {})
+            if config['credentials']['usernames'] is None:
+                config['credentials']['usernames'] = {}
+            self._config, self._signature = config, signature
+        return self._config
+
+    def _write(self, config):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as file:
+            yaml.dump(config, file, default_flow_style=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+        stat = os.stat(self.path)
+        self._config, self._signature = config, (stat.st_mtime_ns, stat.st_size)
+
+class SQLiteUserStore:
+    """Accounts in a SQLite table, for deployments with many users
+
+    Lookups and signups touch a single row. The credentials handed to the
+    authenticator are rebuilt only when the table changed, tracked by a
+    version counter that triggers bump on every write. Accounts from users.yaml are imported the first
+    time the database is created.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        password TEXT NOT NULL,
+        extra TEXT
+    );
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    INSERT OR IGNORE INTO meta VALUES ('users_version', 0);
+    CREATE TRIGGER IF NOT EXISTS users_inserted AFTER INSERT ON users
+        BEGIN UPDATE meta SET value = value + 1 WHERE key = 'users_version'; END;
+    CREATE TRIGGER IF NOT EXISTS users_updated AFTER UPDATE ON users
+        BEGIN UPDATE meta SET value = value + 1 WHERE key = 'users_version'; END;
+    CREATE TRIGGER IF NOT EXISTS users_deleted AFTER DELETE ON users
+        BEGIN UPDATE meta SET value = value + 1 WHERE key = 'users_version'; END;
+    """
+
+    def __init__(self, db_path=USERS_DB_FILE, yaml_path=USERS_FILE):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._version = None
+        self._credentials = None
+        conn = self.connection()
+        conn.executescript(self.SCHEMA)
+        if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0 and os.path.exists(yaml_path):
+            for username, record in YamlUserStore(yaml_path).users().items():
+                self.add_user(username, record)
+
+    def connection(self):
+        """Get this thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def config(self):
+        return dict(copy.deepcopy(DEFAULT_CONFIG), credentials=self.credentials())
+
+    def users(self):
+        return self.credentials()['usernames']
+
+    def get_user(self, username):
+        row = self.connection().execute(
+            "SELECT name, password, extra FROM users WHERE username = ?", (username,)).fetchone()
+        return self._to_record(row) if row else None
+
+    def credentials(self):
+        """Credentials for streamlit_authenticator, copied per call like YamlUserStore.credentials"""
+        conn = self.connection()
+        version = conn.execute("SELECT value FROM meta WHERE key = 'users_version'").fetchone()[0]
+        with self._lock:
+            if self._credentials is None or version != self._version:
+                rows = conn.execute("SELECT username, name, password, extra FROM users")
+                self._credentials = {'usernames': {row[0]: self._to_record(row[1:]) for row in rows}}
+                self._version = version
+            return {'usernames': {u: dict(r) for u, r in self._credentials['usernames'].items()}}
+
+    def add_user(self, username, record):
+        try:
+            with self.connection() as conn:
+                conn.execute("INSERT INTO users (name, password, extra, username) VALUES (?, ?, ?, ?)",
+                             self._to_row(record) + (username,))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def update_user(self, username, **fields):
+        with self.connection() as conn:
+            row = conn.execute("SELECT name, password, extra FROM users WHERE username = ?",
+                               (username,)).fetchone()
+            record = dict(self._to_record(row), **fields)
+            conn.execute("UPDATE users SET name = ?, password = ?, extra = ? WHERE username = ?",
+                         self._to_row(record) + (username,))
+
+    def save_config(self, config):
+        for username, record in config['credentials']['usernames'].items():
+            if not self.add_user(username, record):
+                self.update_user(username, **record)
+
+    @staticmethod
+    def _to_row(record):
+        extra = {k: v for k, v in record.items() if k not in ('name', 'password')}
+        return record['name'], record['password'], json.dumps(extra) if extra else None
+
+    @staticmethod
+    def _to_record(row):
+        name, password, extra = row
+        record = {'name': name, 'password': password}
+        if extra:
+            record.update(json.loads(extra))
+        return record
+
+def create_user_store(backend=USER_STORE_BACKEND):
+    """Create the user store configured by USER_STORE_BACKEND"""
+    if backend == "sqlite":
+        return SQLiteUserStore()
+    if backend == "yaml":
+        return YamlUserStore()
+    raise ValueError(f"Unknown user store backend: {backend}")
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_user_store():
+    """Get the process-wide user store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_user_store()
+    return _store
\ No newline at end of file
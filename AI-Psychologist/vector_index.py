@@ -0,0 +1,177 @@
+"""
+Vector index module for AI Psychologist app
+Embeds texts through Ollama and searches them by cosine similarity
+"""
+
+import json
+import os
+import threading
+import numpy as np
+from backend_pool import get_pool
+from config import EMBEDDING_MODEL, MEMORY_EMBED_BATCH, MEMORY_SEARCH_BATCH
+
+def embed_texts(texts, model=EMBEDDING_MODEL):
+    """Embed texts through Ollama, MEMORY_EMBED_BATCH per request; returns unit-length float32 rows"""
+    rows = []
+    for start in range(0, len(texts), MEMORY_EMBED_BATCH):
+        response = get_pool().post(model, "/api/embed",
+                                   {"model": model, "input": texts[start:start + MEMORY_EMBED_BATCH]}, retries=1)
+        if response.status_code != 200:
+            raise RuntimeError(f"Embedding request failed (Status: {response.status_code})")
+        rows.extend(response.json()["embeddings"])
+    vectors = np.asarray(rows, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+class VectorIndex:
+    """One user's turn embeddings, memory-mapped from disk
+
+    Vectors are appended as float32 rows to ``vectors.f32`` and their chat,
+    position and text to ``entries.jsonl``. Searching reads the vector file
+    through a read-only memory map, remapped when it grows, in blocks of
+    ``batch`` rows, so the index never has to fit in memory. The files are
+    started over if the embedding model changes.
+    """
+
+    def __init__(self, directory, model=EMBEDDING_MODEL, batch=MEMORY_SEARCH_BATCH):
+        self.directory = directory
+        self.model = model
+        self.batch = batch
+        self.dim = None
+        self.entries = []
+        self.progress = {}  # chat -> first position not indexed yet
+        self._chat_ids = {}  # chat -> small integer
+        self._rows_chat = np.zeros(0, dtype=np.int32)
+        self._vectors = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def append(self, chat, turns, vectors):
+        """Add the embeddings of a chat's new turns"""
+        with self._lock:
+            if self.dim is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self.dim = int(vectors.shape[1])
+                with open(self.path("meta.json"), "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model, "dim": self.dim}, f)
+            entries = [{"chat": chat, "seq": seq, "text": text} for seq, text in turns]
+            # Vectors first: on load, entries without a full vector row are dropped
+            with open(self.path("vectors.f32"), "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            with open(self.path("entries.jsonl"), "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries))
+            self._add_entries(entries)
+            self._map()
+
+    def remove_chat(self, chat):
+        """Drop a chat's turns, rewriting the files without them"""
+        with self._lock:
+            if chat not in self.progress:
+                return
+            keep = self._rows_chat != self._chat_ids[chat]
+            vectors = np.array(self._vectors[keep]) if self._vectors is not None else None
+            entries = [e for e, k in zip(self.entries, keep) if k]
+            self._vectors = None
+            self._write(entries, vectors)
+            self._reset()
+            self._add_entries(entries)
+            self._map()
+
+    def search(self, queries, k, exclude_chat=None):
+        """Best ``(score, entry)`` matches for each query row, highest cosine similarity first"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            vectors, rows_chat, entries = self._vectors, self._rows_chat, self.entries
+            excluded = self._chat_ids.get(exclude_chat)
+        top_scores = np.empty((len(queries), 0), dtype=np.float32)
+        top_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, 0 if vectors is None else len(vectors), self.batch):
+            block = vectors[start:start + self.batch]
+            scores = queries @ block.T
+            if excluded is not None:
+                scores[:, rows_chat[start:start + len(block)] == excluded] = -np.inf
+            rows = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            top_scores = np.hstack([top_scores, scores])
+            top_rows = np.hstack([top_rows, rows])
+            if top_scores.shape[1] > k:
+                best = np.argpartition(-top_scores, k - 1, axis=1)[:, :k]
+                top_scores = np.take_along_axis(top_scores, best, axis=1)
+                top_rows = np.take_along_axis(top_rows, best, axis=1)
+        results = []
+        for scores, rows in zip(top_scores, top_rows):
+            order = np.argsort(-scores)
+            results.append([(float(scores[i]), entries[rows[i]]) for i in order if np.isfinite(scores[i])])
+        return results
+
+    def _load(self):
+        self._reset()
+        try:
+            with open(self.path("meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+        if meta is None or meta.get("model") != self.model:
+            self._write([], None)
+            return
+        self.dim = meta["dim"]
+        entries = []
+        try:
+            with open(self.path("entries.jsonl"), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        break
+        except OSError:
+            pass
+        try:
+            rows = os.path.getsize(self.path("vectors.f32")) // (4 * self.dim)
+        except OSError:
+            rows = 0
+        if rows != len(entries):
+            # A crash between the two appends, keep the turns that are complete in both files
+            entries = entries[:min(rows, len(entries))]
+            vectors = None
+            if entries:
+                vectors = np.fromfile(self.path("vectors.f32"), dtype=np.float32, count=len(entries) * self.dim)
+                vectors = vectors.reshape(len(entries), self.dim)
+            self._write(entries, vectors)
+        self._add_entries(entries)
+        self._map()
+
+    def _write(self, entries, vectors):
+        os.makedirs(self.directory, exist_ok=True)
+        if not entries:
+            for name in ("meta.json", "vectors.f32", "entries.jsonl"):
+                if os.path.exists(self.path(name)):
+                    os.remove(self.path(name))
+            self.dim = None
+            return
+        for name, data in (("vectors.f32", np.ascontiguousarray(vectors, dtype=np.float32).tobytes()),
+                           ("entries.jsonl", "".join(json.dumps(e, ensure_ascii=False) + "\n"
+                                                     for e in entries).encode("utf-8"))):
+            with open(self.path(name) + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(self.path(name) + ".tmp", self.path(name))
+
+    def _reset(self):
+        self.entries = []
+        self.progress = {}
+        self._chat_ids = {}
+        self._rows_chat = np.zeros(0, dtype=np.int32)
+
+    def _add_entries(self, entries):
+        ids = []
+        for entry in entries:
+            chat = entry["chat"]
+            ids.append(self._chat_ids.setdefault(chat, len(self._chat_ids)))
+            self.progress[chat] = max(self.progress.get(chat, 0), entry["seq"] + 2)
+        self.entries = self.entries + entries
+        self._rows_chat = np.concatenate([self._rows_chat, np.asarray(ids, dtype=np.int32)])
+
+    def _map(self):
+        rows = len(self.entries)
+        self._vectors = (np.memmap(self.path("vectors.f32"), dtype=np.float32, mode="r", shape=(rows, self.dim))
+                         if rows else None)
\ No newline at end of file